@@ -0,0 +1,611 @@
+# benchmarks.py
+
+"""
+Benchmarks e verificações de carga executados fora do Streamlit, sempre em
+um banco SQLite temporário (o controle_produtividade.db nunca é tocado).
+
+Uso:
+    python benchmarks.py sessoes [threads] [iteracoes]
+    python benchmarks.py contencao [escritores] [leitores] [segundos]
+    python benchmarks.py pdf [linhas]
+    python benchmarks.py prescricao [registros_por_meta]
+    python benchmarks.py cubo [usuarios] [registros_por_usuario]
+    python benchmarks.py paginas [fiscais] [registros_por_fiscal] [--salvar] [--comparar]
+
+O benchmark de páginas roda sobre dados de dados_sinteticos.py. --salvar
+grava o resultado como baseline (benchmarks_baseline.json) e --comparar
+confronta a execução com a baseline, saindo com erro em caso de regressão.
+As consultas de cada página são contadas por monitor_consultas.py; uma
+página acima de ORCAMENTOS_PAGINAS (ou com N+1) também encerra com erro.
+"""
+
+import json
+import logging
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from db import criar_engine, sessao_escopo, PERFIS_SQLITE, PERFIL_SQLITE
+from modelos import Base, Usuario, Tarefa, RegistroDePontuacao, SaldoMensal, MetaMensal, MetaMensalRegistro
+from metricas import calcular_metricas_mes, calcular_alerta_prescricao
+from saldos_mensais import atualizar_saldos_mensais, chaves_do_registro, reconstruir_saldos_mensais
+from tabela_tarefas import TABELA_TAREFAS
+from dados_sinteticos import gerar_dados
+from relatorios import obter_saldo_por_tarefa
+from cubo_relatorios import carregar_cubo, pivotar_cubo, invalidar_cubo
+from monitor_consultas import instalar_monitor, medir_consultas, verificar_orcamento, OrcamentoDeConsultasExcedido
+
+ARQUIVO_BASELINE = os.getenv(
+    "PRODUTIVIDADE_BENCH_BASELINE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+)
+# Regressão: mais consultas que a baseline, ou tempo acima da tolerância e do ruído
+TOLERANCIA_TEMPO = 0.25
+MARGEM_RUIDO_MS = 2.0
+# Orçamento de consultas por página (execução fria) e repetições toleradas do mesmo formato
+ORCAMENTOS_PAGINAS = {
+    "visao_geral": 6,
+    "consulta_pontuacao": 8,
+    "projecao_expiracao": 4,
+    "gerar_pdf": 8,
+    "projecao_equipe": 5,
+    "relatorios": 8,
+}
+REPETICOES_MAX_PAGINAS = 2
+
+
+def banco_temporario(perfil=PERFIL_SQLITE):
+    """Cria um banco SQLite vazio em um diretório temporário e retorna (engine, fábrica de sessões)."""
+    pasta = tempfile.mkdtemp(prefix="produtividade_bench_")
+    engine = criar_engine(f"sqlite:///{os.path.join(pasta, 'bench.db')}", perfil=perfil)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def benchmark_sessoes(threads=16, iteracoes=50):
+    """
+    Simula vários usuários do painel ao mesmo tempo: cada thread abre uma
+    sessão por "rerun", grava um registro, atualiza o saldo mensal e lê as
+    métricas do mês. Ao final confere contagens, livro-razão e pool.
+    """
+    engine, fabrica = banco_temporario()
+
+    with sessao_escopo(fabrica) as session:
+        tarefa = Tarefa(codigo="01", descricao="Tarefa de teste", pontos=4.0, ativa=True)
+        usuarios = [
+            Usuario(nome=f"Fiscal {i}", login=f"fiscal{i}", senha_hash="x", papel="fiscal")
+            for i in range(threads)
+        ]
+        session.add_all([tarefa, *usuarios])
+        session.commit()
+        tarefa_id = tarefa.id
+        usuario_ids = [u.id for u in usuarios]
+
+    hoje = date.today()
+    periodo = hoje.strftime("%Y-%m")
+    erros = []
+    tempos = []
+
+    def simular_usuario(usuario_id):
+        for _ in range(iteracoes):
+            inicio = time.perf_counter()
+            try:
+                with sessao_escopo(fabrica) as session:
+                    registro = RegistroDePontuacao(
+                        usuario_id=usuario_id,
+                        tarefa_id=tarefa_id,
+                        data_execucao=hoje,
+                        pontos=4.0,
+                        data_expiracao=hoje + timedelta(days=365),
+                        quantidade=1
+                    )
+                    session.add(registro)
+                    atualizar_saldos_mensais(session, chaves_do_registro(registro))
+                    session.commit()
+
+                with sessao_escopo(fabrica) as session:
+                    calcular_metricas_mes(session, usuario_id, periodo)
+            except Exception as e:
+                erros.append(e)
+            tempos.append(time.perf_counter() - inicio)
+
+    inicio_total = time.perf_counter()
+    workers = [threading.Thread(target=simular_usuario, args=(uid,)) for uid in usuario_ids]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    duracao = time.perf_counter() - inicio_total
+
+    with sessao_escopo(fabrica) as session:
+        total_registros = session.query(RegistroDePontuacao).count()
+        ledger = sorted(
+            (s.usuario_id, s.ano_mes, s.realizado, s.expirado)
+            for s in session.query(SaldoMensal)
+        )
+        reconstruir_saldos_mensais(session)
+        ledger_reconstruido = sorted(
+            (s.usuario_id, s.ano_mes, s.realizado, s.expirado)
+            for s in session.query(SaldoMensal)
+        )
+
+    tempos.sort()
+    resultado = {
+        "threads": threads,
+        "iteracoes": iteracoes,
+        "erros": len(erros),
+        "registros_esperados": threads * iteracoes,
+        "registros_gravados": total_registros,
+        "ledger_consistente": ledger == ledger_reconstruido,
+        "conexoes_abertas": engine.pool.checkedout(),
+        "duracao_s": round(duracao, 3),
+        "p50_ms": round(tempos[len(tempos) // 2] * 1000, 2),
+        "p95_ms": round(tempos[int(len(tempos) * 0.95)] * 1000, 2),
+    }
+    engine.dispose()
+    return resultado
+
+
+def benchmark_contencao(escritores=4, leitores=8, segundos=3.0, perfis=None):
+    """
+    Mede, para cada perfil de PRAGMA, quantas gravações e leituras
+    concorrentes completam em um intervalo fixo e quantas falham com
+    "database is locked".
+    """
+    resultados = {}
+    for perfil in perfis or PERFIS_SQLITE:
+        engine, fabrica = banco_temporario(perfil)
+        with sessao_escopo(fabrica) as session:
+            tarefa = Tarefa(codigo="01", descricao="Tarefa de teste", pontos=4.0, ativa=True)
+            usuario = Usuario(nome="Fiscal", login="fiscal", senha_hash="x", papel="fiscal")
+            session.add_all([tarefa, usuario])
+            session.commit()
+            tarefa_id, usuario_id = tarefa.id, usuario.id
+
+        hoje = date.today()
+        periodo = hoje.strftime("%Y-%m")
+        contadores = {"gravacoes": 0, "leituras": 0, "bloqueios": 0}
+        trava = threading.Lock()
+        fim = time.perf_counter() + segundos
+
+        def somar(chave):
+            with trava:
+                contadores[chave] += 1
+
+        def escrever():
+            while time.perf_counter() < fim:
+                try:
+                    with sessao_escopo(fabrica) as session:
+                        for _ in range(10):
+                            session.add(RegistroDePontuacao(
+                                usuario_id=usuario_id, tarefa_id=tarefa_id, data_execucao=hoje,
+                                pontos=4.0, data_expiracao=hoje + timedelta(days=365), quantidade=1
+                            ))
+                        session.commit()
+                    somar("gravacoes")
+                except OperationalError:
+                    somar("bloqueios")
+
+        def ler():
+            while time.perf_counter() < fim:
+                try:
+                    with sessao_escopo(fabrica) as session:
+                        calcular_metricas_mes(session, usuario_id, periodo)
+                    somar("leituras")
+                except OperationalError:
+                    somar("bloqueios")
+
+        workers = [threading.Thread(target=escrever) for _ in range(escritores)]
+        workers += [threading.Thread(target=ler) for _ in range(leitores)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        engine.dispose()
+
+        resultados[perfil] = {
+            chave: round(valor / segundos, 1) if chave != "bloqueios" else valor
+            for chave, valor in contadores.items()
+        }
+    return resultados
+
+
+def benchmark_pdf(linhas=5000, repeticoes=3):
+    """
+    Desenha o PDF de registros utilizados com linhas sintéticas, medindo
+    separadamente as duas otimizações do MedidorDeLinhas: o cache das
+    medições (memoizar) e o atalho com cell para textos de uma linha
+    (linha_unica). Os ganhos são relativos ao desenho sem nenhuma delas.
+    """
+    from consulta_pontuacao import _montar_pdf_registros
+
+    sorteio = random.Random(42)
+    hoje = date.today()
+    dados = []
+    for i in range(linhas):
+        _, descricao, pontos = sorteio.choice(TABELA_TAREFAS)
+        qtd = sorteio.choice((1, 1, 1, 2, 3))
+        if qtd > 1:
+            descricao = f"{descricao} (x{qtd})"
+        dados.append((
+            hoje - timedelta(days=sorteio.randint(0, 360)),
+            f"{sorteio.randint(1, 99999):05d}/{sorteio.randint(2020, 2025)}",
+            descricao,
+            pontos * qtd
+        ))
+    dados.sort(key=lambda x: x[0])
+    metade = linhas // 2
+
+    resultado = {"linhas": linhas}
+    variantes = (
+        ("sem_otimizacao", False, False),
+        ("so_cache", True, False),
+        ("so_linha_unica", False, True),
+        ("cache_e_linha_unica", True, True),
+    )
+    for rotulo, memoizar, linha_unica in variantes:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            conteudo = _montar_pdf_registros(
+                "2025-01", "Fiscal Benchmark", dados[:metade], dados[metade:], memoizar, linha_unica
+            )
+            tempos.append(time.perf_counter() - inicio)
+        resultado[f"{rotulo}_s"] = round(min(tempos), 3)
+        resultado[f"{rotulo}_bytes"] = len(conteudo)
+    for rotulo, _, _ in variantes[1:]:
+        resultado[f"ganho_{rotulo}"] = f"{resultado['sem_otimizacao_s'] / resultado[f'{rotulo}_s']:.2f}x"
+    return resultado
+
+
+def benchmark_prescricao(registros_por_meta=20, tamanhos=(1, 10, 100)):
+    """
+    Conta as consultas do alerta de prescrição da Visão Geral para usuários
+    com quantidades crescentes de metas confirmadas; o número de consultas
+    deve ser o mesmo em todos os tamanhos.
+    """
+    engine, fabrica = banco_temporario()
+    consultas = [0]
+
+    def contar(*_):
+        consultas[0] += 1
+
+    event.listen(engine, "before_cursor_execute", contar)
+
+    hoje = date.today()
+    mes_prescricao = date(hoje.year - 1, hoje.month, 1)
+    resultado = {}
+    with sessao_escopo(fabrica) as session:
+        tarefa = Tarefa(codigo="01", descricao="Tarefa de teste", pontos=4.0, ativa=True)
+        session.add(tarefa)
+        session.flush()
+
+        for metas in tamanhos:
+            usuario = Usuario(nome=f"Fiscal {metas}", login=f"fiscal{metas}", senha_hash="x", papel="fiscal")
+            session.add(usuario)
+            session.flush()
+            for m in range(metas):
+                registros = [
+                    RegistroDePontuacao(
+                        usuario_id=usuario.id, tarefa_id=tarefa.id, data_execucao=mes_prescricao,
+                        pontos=4.0, data_expiracao=mes_prescricao + timedelta(days=365), quantidade=2
+                    )
+                    for _ in range(registros_por_meta)
+                ]
+                meta = MetaMensal(
+                    usuario_id=usuario.id, ano_mes=f"{hoje.year - 1}-{m % 12 + 1:02d}",
+                    pontos_utilizados=4.0 * registros_por_meta, status="confirmado"
+                )
+                session.add_all([meta, *registros])
+                session.flush()
+                session.add_all([
+                    MetaMensalRegistro(meta_id=meta.id, registro_id=r.id, quantidade_utilizada=1)
+                    for r in registros
+                ])
+            session.commit()
+            reconstruir_saldos_mensais(session)
+
+            # usuario.id fora da medição: depois do commit o objeto é recarregado
+            usuario_id = usuario.id
+            consultas[0] = 0
+            inicio = time.perf_counter()
+            alerta = calcular_alerta_prescricao(session, usuario_id, hoje)
+            resultado[f"metas_{metas}"] = {
+                "consultas": consultas[0],
+                "ms": round((time.perf_counter() - inicio) * 1000, 2),
+                "saldo": alerta["saldo"],
+                "saldo_esperado": 4.0 * registros_por_meta * metas,  # metade das 2 unidades usada
+            }
+
+    engine.dispose()
+    return resultado
+
+
+def benchmark_cubo(usuarios=300, registros_por_usuario=400, equipes=10, repeticoes=5):
+    """
+    Compara, para um setor inteiro e os últimos 12 meses, a varredura
+    agrupada dos registros (relatorios.obter_saldo_por_tarefa) com o recorte
+    do cubo de relatórios seguido das tabelas dinâmicas por equipe e tarefa.
+    """
+    engine, fabrica = banco_temporario()
+    geracao = gerar_dados(
+        fabrica, fiscais=usuarios, registros_por_fiscal=registros_por_usuario,
+        setores=1, equipes_por_setor=equipes, meses=12
+    )
+    hoje = date.today()
+    mes_inicial = (hoje.replace(day=1) - timedelta(days=335)).strftime("%Y-%m")
+    mes_final = hoje.strftime("%Y-%m")
+
+    with sessao_escopo(fabrica) as session:
+        usuario_ids = [uid for (uid,) in session.query(Usuario.id).filter(Usuario.papel == "fiscal")]
+
+        def varredura():
+            return obter_saldo_por_tarefa(
+                usuario_ids=usuario_ids, data_inicial=date.fromisoformat(f"{mes_inicial}-01"),
+                data_final=hoje, bind=engine
+            )
+
+        def cubo():
+            df = carregar_cubo(session, usuario_ids, mes_inicial, mes_final)
+            pivotar_cubo(df, "equipe", "trimestre", "gerado")
+            pivotar_cubo(df, "tarefa", "mes", "saldo")
+            return df
+
+        def medir(funcao):
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                resultado = funcao()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            return round(min(tempos), 2), resultado
+
+        ms_varredura, df_varredura = medir(varredura)
+        invalidar_cubo()
+        inicio = time.perf_counter()
+        cubo()
+        ms_cubo_frio = (time.perf_counter() - inicio) * 1000
+        ms_cubo, df_cubo = medir(cubo)
+
+    engine.dispose()
+    return {
+        "registros": geracao["registros"],
+        "linhas_saldo_mensal": geracao["linhas_saldo_mensal"],
+        "reconstrucao_s": geracao["saldos_s"],
+        "varredura_ms": ms_varredura,
+        "cubo_frio_ms": round(ms_cubo_frio, 2),
+        "cubo_ms": ms_cubo,
+        "mesmo_total": abs(df_varredura["pontos_gerados"].sum() - df_cubo["gerado"].sum()) < 1e-6,
+    }
+
+
+def benchmark_paginas(fiscais=300, registros_por_fiscal=300, repeticoes=3):
+    """
+    Executa sem navegador o caminho de consultas e cálculo de cada página
+    sobre um banco sintético. O Streamlit roda em modo bare: os widgets
+    devolvem o valor padrão, como na primeira abertura da página.
+
+    Cada cenário roda uma vez com os caches em memória vazios (frio) e
+    depois `repeticoes` vezes (melhor tempo quente), sempre com uma sessão
+    por execução, como um rerun do painel.
+
+    Retorno:
+        - dict {"pagina/perfil": {consultas, consultas_quente, repeticao_max, frio_ms, ms}},
+          com "orcamento_excedido" nos cenários acima de ORCAMENTOS_PAGINAS,
+          "erro" nos que falharam e "ignorado" nos sem dados para rodar
+    """
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import StopException
+
+    import cache_pdf
+    from catalogo_tarefas import invalidar_catalogo, obter_catalogo
+    from consulta_pontuacao import pagina_consulta_pontuacao, gerar_pdf
+    from cubo_relatorios import pagina_relatorios
+    from helpers import invalidar_usuarios_visiveis, usuarios_visiveis
+    from metricas import invalidar_projecao_expiracao
+    from projecao_expiracao import pagina_projecao_expiracao, exibir_matriz_equipe
+    from visao_geral import pagina_visao_geral
+
+    # Sem ScriptRunContext o Streamlit registra um aviso para cada elemento
+    logging.disable(logging.WARNING)
+    engine, fabrica = banco_temporario()
+    cache_pdf.DIRETORIO_CACHE = os.path.join(os.path.dirname(engine.url.database), "cache_pdf")
+    gerar_dados(fabrica, fiscais=fiscais, registros_por_fiscal=registros_por_fiscal)
+
+    instalar_monitor(engine)
+
+    hoje = date.today()
+    mes_anterior = (hoje.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+    invalidar_catalogo()
+    tarefas_dict = obter_catalogo(fabrica).ativas
+
+    with sessao_escopo(fabrica) as session:
+        perfis = {
+            papel: session.query(Usuario.id, Usuario.login, Usuario.nome, Usuario.papel)
+            .filter(Usuario.papel == papel).order_by(Usuario.id).first()
+            for papel in ("fiscal", "gestor")
+        }
+        # Com taxa_uso < 1 o primeiro fiscal pode não ter meta no mês anterior:
+        # o PDF exige registros utilizados, então o fiscal medido é um que tenha
+        fiscal_com_meta = (
+            session.query(Usuario.id, Usuario.login, Usuario.nome, Usuario.papel)
+            .join(MetaMensal, MetaMensal.usuario_id == Usuario.id)
+            .filter(Usuario.papel == "fiscal", MetaMensal.status == "confirmado",
+                    MetaMensal.ano_mes == mes_anterior)
+            .order_by(Usuario.id).first()
+        )
+        perfis["fiscal"] = fiscal_com_meta or perfis["fiscal"]
+
+    def entrar(papel):
+        usuario = perfis[papel]
+        st.session_state.update(
+            usuario=usuario.login, usuario_id=usuario.id, nome=usuario.nome, papel=usuario.papel,
+            usuario_selecionado_id=usuario.id
+        )
+
+    def matriz_equipe(session):
+        gestor = session.get(Usuario, perfis["gestor"].id)
+        usuarios = usuarios_visiveis(gestor, session)
+        exibir_matriz_equipe(session, usuarios, hoje, 3, "mes", "Mês de Expiração")
+
+    def pdf_registros(session):
+        # Sem o PDF em cache: mede consultas e desenho
+        cache_pdf.invalidar_pdfs(perfis["fiscal"].id)
+        if gerar_pdf(tarefas_dict, mes_anterior, perfis["fiscal"].nome, session) is None:
+            raise RuntimeError("gerar_pdf não encontrou registros utilizados")
+
+    cenarios = (
+        ("visao_geral", "fiscal", pagina_visao_geral),
+        ("consulta_pontuacao", "fiscal", pagina_consulta_pontuacao),
+        ("projecao_expiracao", "fiscal", pagina_projecao_expiracao),
+        ("gerar_pdf", "fiscal", pdf_registros),
+        ("visao_geral", "gestor", pagina_visao_geral),
+        ("consulta_pontuacao", "gestor", pagina_consulta_pontuacao),
+        ("projecao_equipe", "gestor", matriz_equipe),
+        ("relatorios", "gestor", pagina_relatorios),
+    )
+
+    resultado = {}
+    for pagina, papel, executar in cenarios:
+        if executar is pdf_registros and fiscal_com_meta is None:
+            resultado[f"{pagina}/{papel}"] = {"ignorado": f"nenhum fiscal com meta confirmada em {mes_anterior}"}
+            continue
+        entrar(papel)
+        invalidar_usuarios_visiveis()
+        invalidar_projecao_expiracao()
+        invalidar_cubo()
+
+        tempos, medicoes = [], []
+        try:
+            for _ in range(repeticoes + 1):
+                inicio = time.perf_counter()
+                with medir_consultas(f"{pagina}/{papel}") as medicao, sessao_escopo(fabrica) as session:
+                    try:
+                        executar(session)
+                    except StopException:
+                        raise RuntimeError(f"{pagina}/{papel} parou em st.stop()")
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                medicoes.append(medicao)
+        except Exception as erro:
+            # Uma página com erro não interrompe as demais
+            resultado[f"{pagina}/{papel}"] = {"erro": f"{type(erro).__name__}: {erro}"}
+            continue
+
+        resultado[f"{pagina}/{papel}"] = {
+            "consultas": medicoes[0].consultas,
+            "consultas_quente": medicoes[-1].consultas,
+            "repeticao_max": medicoes[0].maior_repeticao,
+            "frio_ms": round(tempos[0], 2),
+            "ms": round(min(tempos[1:]), 2),
+        }
+        try:
+            verificar_orcamento(medicoes[0], ORCAMENTOS_PAGINAS[pagina], REPETICOES_MAX_PAGINAS)
+        except OrcamentoDeConsultasExcedido as erro:
+            resultado[f"{pagina}/{papel}"]["orcamento_excedido"] = str(erro)
+
+    logging.disable(logging.NOTSET)
+    engine.dispose()
+    return resultado
+
+
+def salvar_baseline(comando, parametros, resultado, caminho=ARQUIVO_BASELINE):
+    """Grava o resultado de um benchmark como baseline, por comando."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            baselines = json.load(arquivo)
+    except (OSError, ValueError):
+        baselines = {}
+    baselines[comando] = {
+        "data": date.today().isoformat(),
+        "parametros": parametros,
+        "resultado": resultado,
+    }
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(baselines, arquivo, indent=2, ensure_ascii=False)
+
+
+def comparar_baseline(comando, parametros, resultado, caminho=ARQUIVO_BASELINE):
+    """
+    Compara cada cenário com a baseline do comando.
+
+    Retorno:
+        - (linhas de relatório, houve regressão)
+    """
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)[comando]
+    except (OSError, ValueError, KeyError):
+        return [f"⚠️ Sem baseline de '{comando}' em {caminho}."], False
+
+    linhas, regressao = [], False
+    if baseline["parametros"] != parametros:
+        linhas.append(f"⚠️ Parâmetros diferentes da baseline ({baseline['parametros']}).")
+    for cenario, atual in resultado.items():
+        if not isinstance(atual, dict) or "ms" not in atual:
+            continue
+        anterior = baseline["resultado"].get(cenario)
+        if anterior is None:
+            linhas.append(f"🆕 {cenario}: sem baseline")
+            continue
+        mais_consultas = atual["consultas"] > anterior["consultas"]
+        mais_lento = (
+            atual["ms"] > anterior["ms"] * (1 + TOLERANCIA_TEMPO)
+            and atual["ms"] - anterior["ms"] > MARGEM_RUIDO_MS
+        )
+        regressao = regressao or mais_consultas or mais_lento
+        variacao = (atual["ms"] / anterior["ms"] - 1) * 100 if anterior["ms"] else 0
+        linhas.append(
+            f"{'🔺' if mais_consultas or mais_lento else '✅'} {cenario}: "
+            f"{anterior['ms']} → {atual['ms']} ms ({variacao:+.0f}%), "
+            f"consultas {anterior['consultas']} → {atual['consultas']}"
+        )
+    return linhas, regressao
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "sessoes"
+    opcoes = {a for a in sys.argv[2:] if a.startswith("--")}
+    argumentos = [int(a) for a in sys.argv[2:] if not a.startswith("--")]
+
+    if comando == "sessoes":
+        resultado = benchmark_sessoes(*argumentos)
+    elif comando == "contencao":
+        resultado = benchmark_contencao(*argumentos)
+    elif comando == "pdf":
+        resultado = benchmark_pdf(*argumentos)
+    elif comando == "prescricao":
+        resultado = benchmark_prescricao(*argumentos)
+    elif comando == "cubo":
+        resultado = benchmark_cubo(*argumentos)
+    elif comando == "paginas":
+        resultado = benchmark_paginas(*argumentos)
+    else:
+        print(f"❌ Benchmark desconhecido: {comando}")
+        sys.exit(1)
+
+    for chave, valor in resultado.items():
+        print(f"{chave}: {valor}")
+
+    estouros = [v["orcamento_excedido"] for v in resultado.values()
+                if isinstance(v, dict) and "orcamento_excedido" in v]
+    erros = [f"{cenario}: {v['erro']}" for cenario, v in resultado.items()
+             if isinstance(v, dict) and "erro" in v]
+    if estouros or erros:
+        print("\n".join(f"🔺 {problema}" for problema in estouros + erros))
+        sys.exit(1)
+
+    if "--comparar" in opcoes:
+        linhas, regressao = comparar_baseline(comando, argumentos, resultado)
+        print("\n".join(linhas))
+        if regressao:
+            sys.exit(1)
+    if "--salvar" in opcoes:
+        salvar_baseline(comando, argumentos, resultado)
+        print(f"💾 Baseline de '{comando}' salva em {ARQUIVO_BASELINE}.")
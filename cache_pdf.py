@@ -0,0 +1,109 @@
+# cache_pdf.py
+
+"""
+Cache em disco dos PDFs gerados na Consulta de Pontuação.
+
+A chave é (tipo do relatório, usuario_id, período, assinatura), onde a
+assinatura é o hash dos dados que entram no documento. Se nada mudou para
+o fiscal no mês, o PDF volta do disco sem passar pelo FPDF; se algo mudou,
+a assinatura muda e o arquivo antigo deixa de ser encontrado.
+
+As telas que confirmam metas ou editam registros chamam invalidar_pdfs
+para apagar na hora os arquivos do usuário a partir do mês afetado. Quando
+o diretório passa do limite de tamanho, os arquivos menos usados (mtime mais
+antigo) são removidos primeiro.
+"""
+
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+
+DIRETORIO_CACHE = os.getenv(
+    "PRODUTIVIDADE_PDF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_pdf")
+)
+LIMITE_CACHE_MB = float(os.getenv("PRODUTIVIDADE_PDF_CACHE_MB", "200"))
+
+# Incrementar quando o layout dos PDFs mudar, para não servir arquivos antigos
+VERSAO_LAYOUT = 1
+
+_trava = threading.Lock()
+
+
+def assinatura(*partes):
+    """Hash estável dos dados que compõem um relatório."""
+    return hashlib.sha256(repr((VERSAO_LAYOUT,) + partes).encode("utf-8")).hexdigest()[:32]
+
+
+def _caminho(tipo, usuario_id, periodo, chave):
+    return os.path.join(DIRETORIO_CACHE, f"{tipo}_{usuario_id}_{periodo}_{chave}.pdf")
+
+
+def obter_pdf(tipo, usuario_id, periodo, chave):
+    """Retorna os bytes do PDF em cache ou None."""
+    caminho = _caminho(tipo, usuario_id, periodo, chave)
+    try:
+        with open(caminho, "rb") as arquivo:
+            conteudo = arquivo.read()
+        os.utime(caminho)  # marca como usado recentemente (LRU)
+        return conteudo
+    except OSError:
+        return None
+
+
+def guardar_pdf(tipo, usuario_id, periodo, chave, conteudo):
+    """Grava o PDF no cache (escrita atômica) e aplica o limite de tamanho."""
+    try:
+        os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=DIRETORIO_CACHE, suffix=".tmp")
+        with os.fdopen(fd, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, _caminho(tipo, usuario_id, periodo, chave))
+    except OSError:
+        return  # cache é opcional: falha de disco não impede o relatório
+    _aplicar_limite()
+
+
+def _aplicar_limite(limite_bytes=None):
+    limite_bytes = LIMITE_CACHE_MB * 1024 * 1024 if limite_bytes is None else limite_bytes
+    with _trava:
+        arquivos = []
+        for caminho in glob.glob(os.path.join(DIRETORIO_CACHE, "*.pdf")):
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except OSError:
+                pass
+
+
+def invalidar_pdfs(usuario_id, a_partir_de=None):
+    """
+    Remove os PDFs do usuário nos períodos >= a_partir_de ('YYYY-MM').
+    Sem período, remove todos os PDFs do usuário.
+    """
+    removidos = 0
+    for caminho in glob.glob(os.path.join(DIRETORIO_CACHE, f"*_{usuario_id}_*.pdf")):
+        partes = os.path.basename(caminho)[:-4].split("_")
+        # nome: <tipo>_<usuario_id>_<periodo>_<assinatura>
+        if len(partes) < 4 or partes[-3] != str(usuario_id):
+            continue
+        if a_partir_de is not None and partes[-2] < a_partir_de:
+            continue
+        try:
+            os.remove(caminho)
+            removidos += 1
+        except OSError:
+            pass
+    return removidos
@@ -1,8 +1,35 @@
+import os
 import streamlit as st
 from datetime import datetime, timedelta
 from auth import exigir_login
-from modelos import Usuario, Tarefa, RegistroDePontuacao, MetaMensalRegistro
+from modelos import Usuario, RegistroDePontuacao, MetaMensalRegistro
 from helpers import usuarios_visiveis
+from catalogo_tarefas import obter_catalogo
+from saldos_mensais import atualizar_saldos_mensais, chaves_do_registro
+from metricas import invalidar_projecao_expiracao
+
+# 📦 Modo compacto: uma linha com quantidade=N em vez de N linhas iguais
+# (PRODUTIVIDADE_REGISTRO_COMPACTO=0 volta ao modo de uma linha por unidade)
+REGISTRO_COMPACTO = os.getenv("PRODUTIVIDADE_REGISTRO_COMPACTO", "1") != "0"
+
+
+def novos_registros(usuario_id, tarefa, data_execucao, quantidade, numero_processo, compacto=REGISTRO_COMPACTO):
+    """Monta os registros de uma execução: um registro compacto ou um por unidade."""
+    data_expiracao = data_execucao + timedelta(days=365)
+    lotes = [quantidade] if compacto else [1] * quantidade
+    return [
+        RegistroDePontuacao(
+            usuario_id=usuario_id,
+            tarefa_id=tarefa.id,
+            data_execucao=data_execucao,
+            quantidade=qtd,
+            pontos=tarefa.pontos,  # pontos por unidade
+            data_expiracao=data_expiracao,
+            numero_processo=numero_processo
+        )
+        for qtd in lotes
+    ]
+
 
 def pagina_cadastrar_produtividade(session):
     st.title("📝 Novo Registro de Produtividade")
@@ -12,7 +39,7 @@ def pagina_cadastrar_produtividade(session):
     nivel_acesso = st.session_state.papel.lower()
 
     # 🔍 Buscar tarefas ativas
-    tarefas_ativas = session.query(Tarefa).filter_by(ativa=True).all()
+    tarefas_ativas = obter_catalogo().lista_ativas()
     if not tarefas_ativas:
         st.warning("⚠️ Nenhuma tarefa ativa disponível.")
         st.stop()
@@ -42,6 +69,11 @@ def pagina_cadastrar_produtividade(session):
         else:
             st.write(f"👤 Registrando produtividade para: **{st.session_state.usuario}**")
 
+    # 📥 Importação em lote a partir de planilha
+    with st.expander("📥 Importar planilha (CSV/XLSX)"):
+        from importar_registros import secao_importar_planilha
+        secao_importar_planilha(session, nomes_usuarios, usuario_selecionado_id)
+
     # ✅ Seleção da tarefa
     opcoes_tarefa = {
         f"{t.codigo} - {t.descricao}": t
@@ -96,23 +128,17 @@ def pagina_cadastrar_produtividade(session):
             )
             st.stop()
 
-        data_expiracao = data_execucao + timedelta(days=365)
-
         try:
-            for _ in range(quantidade_realizada):
-                novo_registro = RegistroDePontuacao(
-                    usuario_id=usuario_selecionado_id,
-                    tarefa_id=tarefa.id,
-                    data_execucao=data_execucao,
-                    quantidade=1,
-                    pontos=tarefa.pontos,
-                    data_expiracao=data_expiracao,
-                    numero_processo=numero_processo  # novo campo
-                )
-                session.add(novo_registro)
+            registros = novos_registros(
+                usuario_selecionado_id, tarefa, data_execucao, int(quantidade_realizada), numero_processo
+            )
+            session.add_all(registros)
 
+            # 📒 Atualiza o saldo mensal na mesma transação
+            atualizar_saldos_mensais(session, chaves_do_registro(registros[0]))
             session.commit()
-            st.success(f"✅ {quantidade_realizada} registro(s) salvo(s) com sucesso!")
+            invalidar_projecao_expiracao()
+            st.success(f"✅ {quantidade_realizada} unidade(s) salva(s) em {len(registros)} registro(s)!")
 
         except Exception as e:
             session.rollback()
@@ -2,6 +2,7 @@ import streamlit as st
 import bcrypt
 from modelos import Usuario, Setor, Equipe
 from auth import exigir_login
+from helpers import invalidar_usuarios_visiveis
 
 def pagina_cadastro_usuario(session):
     st.title("👥 Cadastro de Novo Usuário")
@@ -76,5 +77,6 @@ def pagina_cadastro_usuario(session):
 
             session.add(novo_usuario)
             session.commit()
+            invalidar_usuarios_visiveis()
             st.success(f"✅ Usuário '{login}' cadastrado com sucesso!")
 
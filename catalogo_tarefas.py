@@ -0,0 +1,93 @@
+# catalogo_tarefas.py
+
+"""
+Catálogo de tarefas em memória, compartilhado por todo o processo.
+
+A tabela de tarefas tem poucas linhas e quase nunca muda, então as páginas
+leem daqui em vez de consultar o banco a cada rerun. carregar_tarefas_padrao
+chama invalidar_catalogo sempre que insere, atualiza, reativa ou desativa
+uma tarefa; a próxima leitura recarrega o catálogo com a nova versão.
+"""
+
+import threading
+from dataclasses import dataclass, field
+
+from db import SessionLocal
+from modelos import Tarefa
+
+
+@dataclass(frozen=True)
+class TarefaCatalogo:
+    """Cópia imutável de uma Tarefa, segura para ser usada fora da sessão."""
+    id: int
+    codigo: str
+    descricao: str
+    pontos: float
+    ativa: bool
+
+
+@dataclass(frozen=True)
+class Catalogo:
+    versao: int
+    por_id: dict = field(default_factory=dict)      # id -> TarefaCatalogo (todas)
+    por_codigo: dict = field(default_factory=dict)  # codigo -> TarefaCatalogo (todas)
+
+    @property
+    def ativas(self):
+        """Dicionário id -> tarefa apenas com as tarefas ativas."""
+        return {tid: t for tid, t in self.por_id.items() if t.ativa}
+
+    def lista_ativas(self):
+        """Tarefas ativas em ordem de código."""
+        return sorted((t for t in self.por_id.values() if t.ativa), key=lambda t: t.codigo)
+
+
+_trava = threading.Lock()
+_versao = 0
+_catalogo = None
+
+
+def _carregar(versao, fabrica):
+    session = fabrica()
+    try:
+        tarefas = [
+            TarefaCatalogo(
+                id=t.id,
+                codigo=t.codigo,
+                descricao=t.descricao or "",
+                pontos=t.pontos,
+                ativa=bool(t.ativa)
+            )
+            for t in session.query(Tarefa).all()
+        ]
+    finally:
+        session.close()
+    return Catalogo(
+        versao=versao,
+        por_id={t.id: t for t in tarefas},
+        por_codigo={t.codigo: t for t in tarefas}
+    )
+
+
+def obter_catalogo(fabrica=None):
+    """Retorna o catálogo atual, carregando do banco só quando a versão mudou."""
+    global _catalogo
+    catalogo = _catalogo
+    if catalogo is not None and catalogo.versao == _versao:
+        return catalogo
+    with _trava:
+        if _catalogo is None or _catalogo.versao != _versao:
+            _catalogo = _carregar(_versao, fabrica or SessionLocal)
+        return _catalogo
+
+
+def invalidar_catalogo():
+    """Incrementa a versão do catálogo; a próxima leitura recarrega do banco."""
+    global _versao
+    with _trava:
+        _versao += 1
+        return _versao
+
+
+def versao_catalogo():
+    return _versao
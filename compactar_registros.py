@@ -0,0 +1,122 @@
+# compactar_registros.py
+
+"""
+Migração para o modo compacto de registros de pontuação.
+
+Colapsa registros idênticos (mesmo usuário, tarefa, datas, processo e pontos
+por unidade), que o cadastro antigo gravava um por unidade, em um único
+registro com quantidade=N. Os vínculos com metas são apontados para o
+registro mantido, somando quantidade_utilizada quando a mesma meta usava
+mais de uma das linhas. Pode ser executado várias vezes.
+"""
+
+from sqlalchemy import func, select, update, delete, and_
+
+from db import SessionLocal
+from modelos import RegistroDePontuacao, MetaMensalRegistro
+from saldos_mensais import reconstruir_saldos_mensais
+
+
+CHAVE_REGISTRO = (
+    RegistroDePontuacao.usuario_id,
+    RegistroDePontuacao.tarefa_id,
+    RegistroDePontuacao.data_execucao,
+    RegistroDePontuacao.data_expiracao,
+    RegistroDePontuacao.numero_processo,
+    RegistroDePontuacao.pontos,
+)
+
+
+def compactar_registros(session=None):
+    """
+    Executa a compactação em uma única transação.
+
+    Retorno:
+        - dict com grupos compactados, registros removidos e vínculos mesclados
+    """
+    propria_sessao = session is None
+    if propria_sessao:
+        session = SessionLocal()
+
+    try:
+        # 1️⃣ Grupos de registros idênticos, mantendo o menor id
+        grupos = (
+            select(
+                func.min(RegistroDePontuacao.id).label("mantido"),
+                func.sum(func.coalesce(RegistroDePontuacao.quantidade, 1)).label("quantidade"),
+                func.max(func.coalesce(RegistroDePontuacao.usado_para_meta, False)).label("usado"),
+                *CHAVE_REGISTRO
+            )
+            .group_by(*CHAVE_REGISTRO)
+            .having(func.count() > 1)
+            .subquery()
+        )
+
+        # 2️⃣ Cada registro duplicado -> registro mantido
+        membros = session.execute(
+            select(RegistroDePontuacao.id, grupos.c.mantido).join(
+                grupos,
+                and_(*(
+                    coluna.is_not_distinct_from(grupos.c[coluna.key])
+                    for coluna in CHAVE_REGISTRO
+                ))
+            )
+        ).all()
+        destino = {rid: mantido for rid, mantido in membros if rid != mantido}
+        if not destino:
+            return {"grupos": 0, "removidos": 0, "vinculos_mesclados": 0}
+
+        totais = session.execute(select(grupos.c.mantido, grupos.c.quantidade, grupos.c.usado)).all()
+        for mantido, quantidade, usado in totais:
+            session.execute(
+                update(RegistroDePontuacao)
+                .where(RegistroDePontuacao.id == mantido)
+                .values(quantidade=quantidade, usado_para_meta=bool(usado))
+            )
+
+        # 3️⃣ Vínculos com metas passam a apontar para o registro mantido
+        ids_envolvidos = set(destino) | set(destino.values())
+        vinculos = {}
+        mesclados = 0
+        for vinculo in session.query(MetaMensalRegistro).filter(
+            MetaMensalRegistro.registro_id.in_(ids_envolvidos)
+        ).order_by(MetaMensalRegistro.id):
+            alvo = destino.get(vinculo.registro_id, vinculo.registro_id)
+            chave = (vinculo.meta_id, alvo)
+            if chave in vinculos:
+                existente = vinculos[chave]
+                existente.quantidade_utilizada = (
+                    (existente.quantidade_utilizada or 1) + (vinculo.quantidade_utilizada or 1)
+                )
+                session.delete(vinculo)
+                mesclados += 1
+            else:
+                vinculo.registro_id = alvo
+                vinculo.quantidade_utilizada = vinculo.quantidade_utilizada or 1
+                vinculos[chave] = vinculo
+        session.flush()
+
+        # 4️⃣ Remove as linhas duplicadas
+        removidos = list(destino)
+        for i in range(0, len(removidos), 900):
+            session.execute(
+                delete(RegistroDePontuacao).where(RegistroDePontuacao.id.in_(removidos[i:i + 900]))
+            )
+
+        session.commit()
+        # Totais não mudam, mas o livro-razão é refeito para garantir consistência
+        reconstruir_saldos_mensais(session)
+        return {"grupos": len(totais), "removidos": len(removidos), "vinculos_mesclados": mesclados}
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if propria_sessao:
+            session.close()
+
+
+if __name__ == "__main__":
+    resultado = compactar_registros()
+    print(f"📦 {resultado['grupos']} grupos compactados.")
+    print(f"🧹 {resultado['removidos']} registros duplicados removidos.")
+    print(f"🔗 {resultado['vinculos_mesclados']} vínculos com metas mesclados.")
@@ -4,7 +4,12 @@ from dateutil.relativedelta import relativedelta
 from sqlalchemy import func
 from modelos import Usuario, Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro
 from auth import exigir_login
-from helpers import usuarios_visiveis
+from helpers import usuarios_visiveis, quantidades_utilizadas, unidades_disponiveis
+from metricas import calcular_metricas_mes, invalidar_projecao_expiracao
+from catalogo_tarefas import obter_catalogo
+from saldos_mensais import atualizar_saldos_mensais, chaves_do_registro
+from tabela_tarefas import TABELA_TAREFAS
+from cache_pdf import assinatura, obter_pdf, guardar_pdf, invalidar_pdfs
 from fpdf import FPDF
 import base64
 from datetime import timedelta
@@ -17,8 +22,7 @@ from datetime import timedelta
 # 🔄 Carrega dados principais - 
 # ===================================================
 def carregar_dados(session, usuario_id, periodo):
-    tarefas = session.query(Tarefa).filter_by(ativa=True).all()
-    tarefas_dict = {t.id: t for t in tarefas}
+    tarefas_dict = obter_catalogo().ativas
 
     todos_registros = session.query(RegistroDePontuacao).filter(
         RegistroDePontuacao.usuario_id == usuario_id
@@ -38,28 +42,40 @@ def carregar_dados(session, usuario_id, periodo):
 # ===================================================
 # 📋 Exibe tabela de registros
 # ===================================================
-def exibir_tabela_registros(registros, tarefas_dict, inicio_mes, fim_mes, mostrar_utilizados, chave_prefixo, session):
+def exibir_tabela_registros(registros, tarefas_dict, inicio_mes, fim_mes, mostrar_utilizados, chave_prefixo, session,
+                            consumo=None):
     selecionados = []
     total = 0
 
+    # 🔍 Unidades já utilizadas carregadas de uma vez para toda a lista
+    if consumo is None:
+        consumo = quantidades_utilizadas(session, [r.id for r in registros])
+
     cabecalho = st.columns([2, 4, 2, 2, 2])
     for i, titulo in enumerate(["Data", "Tarefa", "Pontos", "Expira em", "Selecionar"]):
         cabecalho[i].markdown(f"**{titulo}**")
 
     for r in registros:
         tarefa = tarefas_dict.get(r.tarefa_id)
-        ja_utilizado = session.query(MetaMensalRegistro).filter_by(registro_id=r.id).first()
+        quantidade = r.quantidade or 1
+        usado = consumo.get(r.id, (quantidade, 0))[1]
+        restante = quantidade - usado
+        ja_utilizado = restante <= 0
         expira_este_mes = inicio_mes <= r.data_expiracao < fim_mes
         estilo = "background-color: #fff3cd;" if expira_este_mes else ""
 
         if not mostrar_utilizados and ja_utilizado:
             continue
 
-        descricao = tarefa.descricao + (" ✅ já utilizado" if ja_utilizado else "")
+        descricao = tarefa.descricao + (f" (×{quantidade})" if quantidade > 1 else "")
+        if ja_utilizado:
+            descricao += " ✅ já utilizado"
+        elif usado:
+            descricao += f" 🔸 {usado} de {quantidade} utilizados"
         linha = st.columns([2, 4, 2, 2, 2])
         linha[0].markdown(f"<div style='{estilo}'>{r.data_execucao.strftime('%d/%m/%Y')}</div>", unsafe_allow_html=True)
         linha[1].markdown(f"<div style='{estilo}'>{descricao}</div>", unsafe_allow_html=True)
-        linha[2].markdown(f"<div style='{estilo}'>{tarefa.pontos:.0f} pts</div>", unsafe_allow_html=True)
+        linha[2].markdown(f"<div style='{estilo}'>{tarefa.pontos * quantidade:.0f} pts</div>", unsafe_allow_html=True)
         linha[3].markdown(f"<div style='{estilo}'>{r.data_expiracao.strftime('%d/%m/%Y')}</div>", unsafe_allow_html=True)
 
         if ja_utilizado:
@@ -67,8 +83,15 @@ def exibir_tabela_registros(registros, tarefas_dict, inicio_mes, fim_mes, mostra
         else:
             usar = linha[4].checkbox("", key=f"{chave_prefixo}_{r.id}")
             if usar:
-                selecionados.append((r.id, tarefa.pontos))
-                total += tarefa.pontos
+                # Registros compactos permitem usar só parte das unidades
+                qtd = 1
+                if restante > 1:
+                    qtd = linha[4].number_input(
+                        "Quantidade", min_value=1, max_value=restante, value=restante,
+                        key=f"{chave_prefixo}_qtd_{r.id}", label_visibility="collapsed"
+                    )
+                selecionados.append((r.id, tarefa.pontos * qtd, qtd))
+                total += tarefa.pontos * qtd
 
     return selecionados, total
 
@@ -77,7 +100,8 @@ def exibir_tabela_registros(registros, tarefas_dict, inicio_mes, fim_mes, mostra
 # ✅ Confirma registros selecionados
 # ===================================================
 def confirmar_pontuacao(session, usuario_id, periodo, registros):
-    total_selecionado = sum(p for _, p in registros)
+    """registros: lista de (registro_id, pontos, quantidade utilizada)."""
+    total_selecionado = sum(p for _, p, _ in registros)
 
     ja_confirmado = session.query(MetaMensal).filter_by(
         usuario_id=usuario_id,
@@ -87,11 +111,11 @@ def confirmar_pontuacao(session, usuario_id, periodo, registros):
 
     if ja_confirmado:
         ja_confirmado.pontos_utilizados += total_selecionado
-        for reg_id, _ in registros:
+        for reg_id, _, qtd in registros:
             session.add(MetaMensalRegistro(
                 meta_id=ja_confirmado.id,
                 registro_id=reg_id,
-                quantidade_utilizada=1
+                quantidade_utilizada=qtd
             ))
     else:
         novo_uso = MetaMensal(
@@ -103,16 +127,28 @@ def confirmar_pontuacao(session, usuario_id, periodo, registros):
             validador_id=st.session_state.usuario_id
         )
         session.add(novo_uso)
-        session.commit()
+        session.flush()  # obtém o id sem encerrar a transação
 
-        for reg_id, _ in registros:
+        for reg_id, _, qtd in registros:
             session.add(MetaMensalRegistro(
                 meta_id=novo_uso.id,
                 registro_id=reg_id,
-                quantidade_utilizada=1
+                quantidade_utilizada=qtd
             ))
 
+    # 📒 Saldo mensal: mês da meta + meses de expiração dos registros usados
+    chaves = {(usuario_id, periodo)}
+    for registro in session.query(RegistroDePontuacao).filter(
+        RegistroDePontuacao.id.in_([reg_id for reg_id, _, _ in registros])
+    ):
+        chaves |= chaves_do_registro(registro)
+    atualizar_saldos_mensais(session, chaves)
+
     session.commit()
+
+    # 🗃️ PDFs do usuário a partir do mês mais antigo afetado ficam desatualizados
+    invalidar_pdfs(usuario_id, a_partir_de=min(mes for _, mes in chaves))
+    invalidar_projecao_expiracao()
     st.success(f"🎉 {total_selecionado:.0f} pontos confirmados para {periodo}.")
     st.rerun()
 
@@ -122,36 +158,45 @@ def confirmar_pontuacao(session, usuario_id, periodo, registros):
 # CALCULA SALDO TOTAL
 # ----------------------------------------------------------------------
 # ✅ Função utilitária para cálculo do saldo total
-def calcular_saldo_total(registros, registros_principais, tarefas_dict, inicio_mes, session):
-    registros_anteriores = [
-        r for r in registros
-        if r.data_execucao < inicio_mes
-           and r.data_expiracao >= inicio_mes
-           and not session.query(MetaMensalRegistro)
-               .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-               .filter(
-                   MetaMensalRegistro.registro_id == r.id,
-                   MetaMensal.status == "confirmado"
-               )
-               .first()
-    ]
+def calcular_saldos_totais(session, usuario_ids, inicio_mes):
+    """
+    Saldo de pontos não utilizados e não expirados até o mês, por usuário.
+
+    Considera as unidades ainda não utilizadas em metas confirmadas dos
+    registros executados até o fim do mês que não expiraram no início dele.
+    Tudo é resolvido em um único SELECT agregado.
+
+    Retorno:
+        - dict {usuario_id: saldo}; usuários sem saldo aparecem com 0
+    """
+    usuario_ids = list(usuario_ids)
+    if not usuario_ids:
+        return {}
+    fim_mes = inicio_mes + relativedelta(months=1)
+    disponivel = unidades_disponiveis()
+
+    linhas = (
+        session.query(RegistroDePontuacao.usuario_id, func.sum(Tarefa.pontos * disponivel))
+        .join(Tarefa, RegistroDePontuacao.tarefa_id == Tarefa.id)
+        .filter(
+            RegistroDePontuacao.usuario_id.in_(usuario_ids),
+            RegistroDePontuacao.data_execucao < fim_mes,
+            RegistroDePontuacao.data_expiracao >= inicio_mes,
+            Tarefa.ativa == True,
+            disponivel > 0
+        )
+        .group_by(RegistroDePontuacao.usuario_id)
+        .all()
+    )
 
-    registros_mes = [
-        r for r in registros_principais
-        if r.data_expiracao >= inicio_mes
-           and not session.query(MetaMensalRegistro)
-               .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-               .filter(
-                   MetaMensalRegistro.registro_id == r.id,
-                   MetaMensal.status == "confirmado"
-               )
-               .first()
-    ]
+    saldos = {uid: 0 for uid in usuario_ids}
+    saldos.update({uid: total or 0 for uid, total in linhas})
+    return saldos
 
-    saldo_anteriores = sum(tarefas_dict[r.tarefa_id].pontos for r in registros_anteriores if r.tarefa_id in tarefas_dict)
-    saldo_mes = sum(tarefas_dict[r.tarefa_id].pontos for r in registros_mes if r.tarefa_id in tarefas_dict)
 
-    return saldo_anteriores + saldo_mes
+def calcular_saldo_total(session, usuario_id, inicio_mes):
+    """Saldo total de um único usuário (ver calcular_saldos_totais)."""
+    return calcular_saldos_totais(session, [usuario_id], inicio_mes)[usuario_id]
 
 
 
@@ -163,25 +208,8 @@ def calcular_saldo_total(registros, registros_principais, tarefas_dict, inicio_m
 def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
     from modelos import MetaMensalRegistro, RegistroDePontuacao, MetaMensal, Usuario
     from datetime import datetime, timedelta
-    from fpdf import FPDF
+    from sqlalchemy.orm import contains_eager, selectinload
     import streamlit as st
-    import base64
-
-    class PDF(FPDF):
-        def __init__(self, periodo, nome_fiscal):
-            super().__init__()
-            self.periodo = periodo
-            self.nome_fiscal = nome_fiscal
-
-        def header(self):
-            if self.page_no() > 1:
-                self.set_font("Arial", '', 9)
-                self.cell(
-                    0, 8,
-                    f"Continuação - Registros de Pontuação {self.periodo} ({self.nome_fiscal})",
-                    0, 1, 'C'
-                )
-                self.ln(2)
 
     # --------------------------------
     # 🆔 Identifica usuários permitidos
@@ -189,7 +217,12 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
     usuario_logado = session.query(Usuario).get(st.session_state.usuario_id)
     usuario_selecionado_id = st.session_state.get("usuario_selecionado_id", usuario_logado.id)
 
-    fiscal = session.query(Usuario).filter(Usuario.nome == nome_fiscal).first()
+    fiscal = (
+        session.query(Usuario)
+        .options(selectinload(Usuario.liderados))
+        .filter(Usuario.nome == nome_fiscal)
+        .first()
+    )
     if fiscal:
         ids_permitidos = [u.id for u in fiscal.liderados] + [fiscal.id]
     else:
@@ -208,6 +241,7 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
         session.query(MetaMensalRegistro)
         .join(RegistroDePontuacao)
         .join(MetaMensal)
+        .options(contains_eager(MetaMensalRegistro.registro))
         .filter(
             RegistroDePontuacao.data_execucao >= inicio_mes,
             RegistroDePontuacao.data_execucao < fim_mes,
@@ -222,6 +256,7 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
         session.query(MetaMensalRegistro)
         .join(RegistroDePontuacao)
         .join(MetaMensal)
+        .options(contains_eager(MetaMensalRegistro.registro))
         .filter(
             RegistroDePontuacao.data_execucao < inicio_mes,
             MetaMensal.ano_mes == periodo,
@@ -235,6 +270,114 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
         st.warning("Nenhum registro utilizado no período informado.")
         return
 
+    def linhas_do_bloco(registros):
+        linhas = []
+        for r in registros:
+            reg = r.registro
+            tarefa = tarefas_dict.get(reg.tarefa_id)
+            qtd = r.quantidade_utilizada or 1
+            desc = tarefa.descricao if tarefa else "(Tarefa não encontrada)"
+            if qtd > 1:
+                desc = f"{desc} (x{qtd})"
+            pts = tarefa.pontos * qtd if tarefa else 0
+            linhas.append((reg.data_execucao, reg.numero_processo or "", desc, pts))
+        linhas.sort(key=lambda x: x[0])
+        return linhas
+
+    linhas_mes = linhas_do_bloco(registros_mes_utilizados)
+    linhas_antigos = linhas_do_bloco(registros_antigos_utilizados)
+
+    # --------------------------------
+    # 🗃️ Cache: mesmo conteúdo -> mesmo PDF
+    # --------------------------------
+    dono_id = fiscal.id if fiscal else usuario_selecionado_id
+    chave = assinatura(periodo, nome_fiscal, linhas_mes, linhas_antigos)
+    pdf_bytes = obter_pdf("registros", dono_id, periodo, chave)
+    if pdf_bytes is None:
+        pdf_bytes = _montar_pdf_registros(periodo, nome_fiscal, linhas_mes, linhas_antigos)
+        guardar_pdf("registros", dono_id, periodo, chave, pdf_bytes)
+
+    _exibir_pdf(pdf_bytes, "📥 Baixar PDF", f"registros_{periodo}_{nome_fiscal}.pdf", 800)
+    return pdf_bytes
+
+
+def _exibir_pdf(pdf_bytes, rotulo, nome_arquivo, altura):
+    import streamlit as st
+    import base64
+
+    st.download_button(
+        label=rotulo,
+        data=pdf_bytes,
+        file_name=nome_arquivo,
+        mime="application/pdf"
+    )
+
+    base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
+    st.markdown(
+        f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="{altura}px"></iframe>',
+        unsafe_allow_html=True
+    )
+
+
+class MedidorDeLinhas:
+    """
+    Conta as linhas que um texto ocupa em multi_cell, com cache por
+    (fonte, largura, texto). Descrições vêm do catálogo e datas/processos têm
+    largura fixa, então em relatórios grandes quase toda medição é repetida.
+
+    memoizar liga o cache e linha_unica o atalho de desenhar() com cell; são
+    independentes para que o benchmark meça cada um.
+    """
+
+    def __init__(self, pdf, line_h, memoizar=True, linha_unica=True):
+        self.pdf = pdf
+        self.line_h = line_h
+        self.memoizar = memoizar
+        self.linha_unica = linha_unica
+        self._cache = {}
+
+    def linhas(self, largura, texto):
+        chave = (self.pdf.font_family, self.pdf.font_style, self.pdf.font_size_pt, largura, texto)
+        if self.memoizar and chave in self._cache:
+            return self._cache[chave]
+        total = len(self.pdf.multi_cell(largura, self.line_h, texto, border=0, split_only=True))
+        if self.memoizar:
+            self._cache[chave] = total
+        return total
+
+    def altura(self, larguras, textos):
+        """Altura da linha da tabela: a maior quantidade de linhas entre as colunas."""
+        return max(self.linhas(w, txt) for w, txt in zip(larguras, textos)) * self.line_h
+
+    def desenhar(self, largura, texto, align='J'):
+        """Texto de uma linha vai direto para cell, sem refazer a quebra de linhas."""
+        if self.linha_unica and self.linhas(largura, texto) == 1:
+            # linha única (a última) nunca é justificada pelo multi_cell
+            self.pdf.cell(largura, self.line_h, texto, border=0, align='L' if align == 'J' else align)
+        else:
+            self.pdf.multi_cell(largura, self.line_h, texto, border=0, align=align)
+
+
+def _montar_pdf_registros(periodo, nome_fiscal, linhas_mes, linhas_antigos, memoizar=True, linha_unica=True):
+    """Desenha o PDF de registros utilizados e retorna os bytes."""
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def __init__(self, periodo, nome_fiscal):
+            super().__init__()
+            self.periodo = periodo
+            self.nome_fiscal = nome_fiscal
+
+        def header(self):
+            if self.page_no() > 1:
+                self.set_font("Arial", '', 9)
+                self.cell(
+                    0, 8,
+                    f"Continuação - Registros de Pontuação {self.periodo} ({self.nome_fiscal})",
+                    0, 1, 'C'
+                )
+                self.ln(2)
+
     # --------------------------------
     # Configura PDF
     # --------------------------------
@@ -245,6 +388,7 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
 
     col_w = [30, 30, 90, 30]
     line_h = 8
+    medidor = MedidorDeLinhas(pdf, line_h, memoizar, linha_unica)
 
     pdf.set_font("Arial", 'B', 14)
     pdf.cell(0, 10, f"Registros de Pontuação - {periodo}", ln=True, align='C')
@@ -264,14 +408,8 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
             pdf.add_page()
             imprime_cabecalho_tabela()
 
-    def escreve_linha(data_txt, proc_txt, desc_txt, pts_txt):
+    def escreve_linha(data_txt, proc_txt, desc_txt, pts_txt, altura_linha):
         pdf.set_font("Arial", '', 11)
-        linhas_data = len(pdf.multi_cell(col_w[0], line_h, data_txt, border=0, split_only=True))
-        linhas_proc = len(pdf.multi_cell(col_w[1], line_h, proc_txt, border=0, split_only=True))
-        linhas_desc = len(pdf.multi_cell(col_w[2], line_h, desc_txt, border=0, split_only=True))
-        linhas_pts  = len(pdf.multi_cell(col_w[3], line_h, pts_txt, border=0, split_only=True))
-
-        altura_linha = max(linhas_data, linhas_proc, linhas_desc, linhas_pts) * line_h
         quebra_antes(altura_linha)
 
         x, y = pdf.get_x(), pdf.get_y()
@@ -281,13 +419,13 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
         pdf.rect(x + col_w[0] + col_w[1] + col_w[2], y, col_w[3], altura_linha)
 
         pdf.set_xy(x, y)
-        pdf.multi_cell(col_w[0], line_h, data_txt, border=0)
+        medidor.desenhar(col_w[0], data_txt)
         pdf.set_xy(x + col_w[0], y)
-        pdf.multi_cell(col_w[1], line_h, proc_txt, border=0)
+        medidor.desenhar(col_w[1], proc_txt)
         pdf.set_xy(x + col_w[0] + col_w[1], y)
-        pdf.multi_cell(col_w[2], line_h, desc_txt, border=0)
+        medidor.desenhar(col_w[2], desc_txt)
         pdf.set_xy(x + col_w[0] + col_w[1] + col_w[2], y)
-        pdf.multi_cell(col_w[3], line_h, pts_txt, border=0, align='C')
+        medidor.desenhar(col_w[3], pts_txt, align='C')
 
         pdf.set_y(y + altura_linha)
 
@@ -298,36 +436,31 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
         pdf.cell(col_w[-1], line_h, f"{total:.0f}", border=1, ln=True)
         pdf.ln(5)
 
-    def escreve_bloco(titulo, registros):
-        total = 0
-        if not registros:
+    def escreve_bloco(titulo, linhas):
+        total = sum(linha[3] for linha in linhas)
+        if not linhas:
             return total
         quebra_antes(line_h * 2)
         pdf.set_font("Arial", 'B', 12)
         pdf.cell(0, line_h, titulo, ln=True)
         imprime_cabecalho_tabela()
-        linhas = []
-        for r in registros:
-            reg = r.registro
-            tarefa = tarefas_dict.get(reg.tarefa_id)
-            desc = tarefa.descricao if tarefa else "(Tarefa não encontrada)"
-            pts = tarefa.pontos if tarefa else 0
-            linhas.append((reg.data_execucao, reg.numero_processo or "", desc, pts))
-            total += pts
-        linhas.sort(key=lambda x: x[0])
-        for linha in linhas:
-            escreve_linha(
-                linha[0].strftime("%d/%m/%Y"),
-                linha[1],
-                linha[2],
-                f"{linha[3]:.0f}"
-            )
+
+        # Alturas de todas as linhas calculadas antes de desenhar
+        textos = [
+            (linha[0].strftime("%d/%m/%Y"), linha[1], linha[2], f"{linha[3]:.0f}")
+            for linha in linhas
+        ]
+        pdf.set_font("Arial", '', 11)
+        alturas = [medidor.altura(col_w, texto) for texto in textos]
+
+        for texto, altura_linha in zip(textos, alturas):
+            escreve_linha(*texto, altura_linha)
         escreve_total_bloco(total)
         return total
 
     # Grupos e totais
-    total_mes = escreve_bloco("Grupo 1 - Utilizados Mês", registros_mes_utilizados)
-    total_antigos = escreve_bloco("Grupo 2 - Utilizados Antigos", registros_antigos_utilizados)
+    total_mes = escreve_bloco("Grupo 1 - Utilizados Mês", linhas_mes)
+    total_antigos = escreve_bloco("Grupo 2 - Utilizados Antigos", linhas_antigos)
 
     quebra_antes(line_h)
     pdf.set_font("Arial", 'B', 12)
@@ -336,70 +469,64 @@ def gerar_pdf(tarefas_dict, periodo, nome_fiscal, session):
 
     # Saída final
     pdf_data = pdf.output(dest="S")
-    pdf_bytes = pdf_data.encode("latin1") if isinstance(pdf_data, str) else bytes(pdf_data)
-
-    st.download_button(
-        label="📥 Baixar PDF",
-        data=pdf_bytes,
-        file_name=f"registros_{periodo}_{nome_fiscal}.pdf",
-        mime="application/pdf"
-    )
-
-    base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-    st.markdown(
-        f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="800px"></iframe>',
-        unsafe_allow_html=True
-    )
+    return pdf_data.encode("latin1") if isinstance(pdf_data, str) else bytes(pdf_data)
 
 
 # ----------------------------------------------------------------------
 # PDF RELATÓRIO DE PRODUTIVIDADE
 # ----------------------------------------------------------------------
 def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, registros, registros_principais, pontos_expirados, periodo, usuario_obj, inicio_mes, session):
-    from fpdf import FPDF
-    import streamlit as st
-    import base64
     from collections import defaultdict
 
+    # 🧮 Contagem de tarefas utilizadas: registros_utilizados traz (registro, quantidade utilizada)
+    quantidades_por_codigo = defaultdict(int)
+    for r, quantidade_utilizada in registros_utilizados:
+        tarefa = tarefas_dict.get(r.tarefa_id)
+        if tarefa and tarefa.codigo:
+            quantidades_por_codigo[tarefa.codigo] += quantidade_utilizada or 1
+
+    # ✅ Cálculo do saldo total usando função utilitária
+    saldo_total = calcular_saldo_total(session, usuario_obj.id, inicio_mes)
+
+    nome = usuario_obj.nome
+    matricula = usuario_obj.matricula or "000000"
+
+    # 🗃️ Cache: mesmo conteúdo -> mesmo PDF
+    chave = assinatura_pontos_totais(
+        periodo, nome, matricula, quantidades_por_codigo, saldo_total, pontos_expirados
+    )
+    pdf_bytes = obter_pdf("pontos_totais", usuario_obj.id, periodo, chave)
+    if pdf_bytes is None:
+        pdf_bytes = _montar_pdf_pontos_totais(
+            periodo, nome, matricula, quantidades_por_codigo, saldo_total, pontos_expirados
+        )
+        guardar_pdf("pontos_totais", usuario_obj.id, periodo, chave, pdf_bytes)
+
+    _exibir_pdf(
+        pdf_bytes, "📥 Baixar PDF Relatório de Pontos Totais",
+        f"relatorio_produtividade_{periodo}_{nome}.pdf", 600
+    )
+    return pdf_bytes
+
+
+def assinatura_pontos_totais(periodo, nome, matricula, quantidades_por_codigo, saldo_total, pontos_expirados):
+    """Chave de cache do relatório de pontos totais (usada também pelo lote)."""
+    return assinatura(
+        periodo, nome, matricula, sorted(quantidades_por_codigo.items()),
+        saldo_total, pontos_expirados, TABELA_TAREFAS
+    )
+
+
+def _montar_pdf_pontos_totais(periodo, nome, matricula, quantidades_por_codigo, saldo_total, pontos_expirados):
+    """Desenha o relatório mensal de produtividade e retorna os bytes."""
+    from fpdf import FPDF
+
     MESES_PT = {
         "01": "Janeiro", "02": "Fevereiro", "03": "Março", "04": "Abril",
         "05": "Maio", "06": "Junho", "07": "Julho", "08": "Agosto",
         "09": "Setembro", "10": "Outubro", "11": "Novembro", "12": "Dezembro"
     }
 
-    TABELA_TAREFAS_FIXA = [
-
-        ("01", "Plantão Fiscal ½ Período", 15.00),
-        ("02", "Diligência Externa", 4.00),
-        ("02.1", "Diligência Externa fora do perímetro urbano", 6.00),
-        ("03", "Termo de Início de Ação Fiscal", 3.00),
-        ("04", "Análise de Documentos Fiscais (por lote de 50)", 4.00),
-        ("05", "Demonstrativo de Apuração de Débito Fiscal (por folha)", 4.00),
-        ("06", "Notificação", 3.00),
-        ("07", "Termo de Ocorrências", 4.00),
-        ("08", "Termo de Diligências", 2.00),
-        ("09", "Lançamento de ISSQN no Movimento Econômico (por exercício)", 2.00),
-        ("10", "Informação/Manifestação em Processo", 5.00),
-        ("11", "Elaboração de Relatórios", 5.00),
-        ("12", "Publicação de Edital", 4.00),
-        ("13", "Outras Atividades não Previstas (por unidade de 1 hora)", 4.00),
-        ("14", "Participação em Cursos ou Programas de Treinamento (por ½ período)", 15.00),
-        ("15", "Apuração Fiscal c/ resultado para um exercício", 52.00),
-        ("15.1", "Apuração Fiscal c/ resultado para exercícios adicionais", 24.00),
-        ("16", "Apuração Fiscal s/ resultado para um exercício", 30.00),
-        ("16.1", "Apuração Fiscal s/ resultado para exercícios adicionais", 8.00),
-        ("17", "Notificação para constituição de crédito tributário (sem A.Infração)", 8.00),
-        ("18", "Enquadramento do ISSQN", 8.00),
-        ("19", "Atividades Internas (por unidade de 1h)", 4.00),
-        ("20", "Auto de Infração", 6.00),
-        ("21", "Manifestação em processo de impugnação de Auto de Infração", 8.00),
-        ("21.1", "Quando o manifestante não for o autor do Auto de Infração", 12.00),
-        ("22", "Chefia ou direção de órgão responsável por atividades previstas nesta tabela (ponto por dia)", 30.00),
-        ("98", "Licenciado", 0),
-        ("99", "Licenciado", 600)
-
-    ]
-
     class PDF(FPDF):
         def __init__(self):
             super().__init__('L', 'mm', 'A4')
@@ -413,8 +540,6 @@ def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, regist
     pdf.set_margins(10, 10, 10)
     pdf.add_page()
 
-    nome = usuario_obj.nome
-    matricula = usuario_obj.matricula or "000000"
     mes_num = periodo.split("-")[1]
     ano = periodo.split("-")[0]
     mes_formatado = f"{MESES_PT.get(mes_num, mes_num)}/{ano}"
@@ -436,13 +561,6 @@ def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, regist
 
     pdf.ln(3)
 
-    # 🧮 Contagem de tarefas utilizadas
-    quantidades_por_codigo = defaultdict(int)
-    for r in registros_utilizados:
-        tarefa = tarefas_dict.get(r.tarefa_id)
-        if tarefa and tarefa.codigo:
-            quantidades_por_codigo[tarefa.codigo] += r.quantidade or 1
-
     # 🧾 Tabela de tarefas
     col_w = [25, 160, 20, 20, 25]
     line_h = 5
@@ -455,7 +573,7 @@ def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, regist
 
     total_mensal = 0
     pdf.set_font("Arial", '', 8)
-    for codigo, descricao, pontos in TABELA_TAREFAS_FIXA:
+    for codigo, descricao, pontos in TABELA_TAREFAS:
         qtd = quantidades_por_codigo.get(codigo, 0)
         total = pontos * qtd
         total_mensal += total
@@ -466,9 +584,6 @@ def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, regist
         pdf.cell(col_w[4], line_h, f"{total:.0f}", border=1, align='C')
         pdf.ln()
 
-    # ✅ Cálculo do saldo total usando função utilitária
-    saldo_total = calcular_saldo_total(registros, registros_principais, tarefas_dict, inicio_mes, session)
-
     # 📊 Resumo final
     resultado_mes = total_mensal + saldo_total - pontos_expirados
     excedente = resultado_mes - 200
@@ -495,20 +610,7 @@ def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, regist
 
     # 📤 Exportação
     pdf_data = pdf.output(dest="S")
-    pdf_bytes = pdf_data.encode("latin1") if isinstance(pdf_data, str) else bytes(pdf_data)
-
-    st.download_button(
-        label="📥 Baixar PDF Relatório de Pontos Totais",
-        data=pdf_bytes,
-        file_name=f"relatorio_produtividade_{periodo}_{usuario_obj.nome}.pdf",
-        mime="application/pdf"
-    )
-
-    base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-    st.markdown(
-        f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600px"></iframe>',
-        unsafe_allow_html=True
-    )
+    return pdf_data.encode("latin1") if isinstance(pdf_data, str) else bytes(pdf_data)
 
 
 # ===================================================
@@ -516,7 +618,6 @@ def gerar_pdf_pontos_totais_detalhado(tarefas_dict, registros_utilizados, regist
 # ===================================================
 def pagina_consulta_pontuacao(session):
     exigir_login()
-    st.session_state.session = session
     st.title("📄 Consulta de Pontuação")
 
     # 🔐 Seleção de usuário com controle de acesso
@@ -567,30 +668,19 @@ def pagina_consulta_pontuacao(session):
 
     # chamada corrigida: só 3 argumentos
     tarefas_dict, registros, _ = carregar_dados(session, usuario_id, periodo)
+    consumo = quantidades_utilizadas(session, [r.id for r in registros])
+    ids_utilizados = {rid for rid, (quantidade, usado) in consumo.items() if usado >= quantidade}
+    metricas = calcular_metricas_mes(session, usuario_id, periodo)
 
     # -------------------------
     # 🔍 Aviso amarelo: pontos que expiram no mês
     # -------------------------
-    expirando_este_mes = [
-        r for r in registros
-        if inicio_mes <= r.data_expiracao < fim_mes
-           and not (
-               session.query(MetaMensalRegistro)
-                      .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-                      .filter(
-                          MetaMensalRegistro.registro_id == r.id,
-                          MetaMensal.status == "confirmado"
-                      )
-                      .first()
-           )
-    ]
-    pontos_expirando = sum(r.pontos for r in expirando_este_mes)
-    if expirando_este_mes:
+    if metricas["qtd_expirando"]:
         st.markdown(
             f"<div style='background-color:#fff3cd;padding:12px;border-radius:6px;'>"
-            f"⚠️ <strong>{len(expirando_este_mes)}</strong> registro(s) irão expirar até "
+            f"⚠️ <strong>{metricas['qtd_expirando']}</strong> unidade(s) irão expirar até "
             f"<strong>{fim_mes.strftime('%d/%m/%Y')}</strong>, totalizando "
-            f"<strong>{pontos_expirando:.0f} pontos</strong>."
+            f"<strong>{metricas['expirando']:.0f} pontos</strong>."
             f"</div>",
             unsafe_allow_html=True
         )
@@ -632,16 +722,7 @@ def pagina_consulta_pontuacao(session):
                        filtro_mes_antigo == "Todos"
                        or (inicio_filtro <= r.data_execucao < fim_filtro)
                )
-               and (
-                       mostrar_utilizados
-                       or not session.query(MetaMensalRegistro)
-                       .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-                       .filter(
-                   MetaMensalRegistro.registro_id == r.id,
-                   MetaMensal.status == "confirmado"
-               )
-                       .first()
-               )
+               and (mostrar_utilizados or r.id not in ids_utilizados)
         ]
 
     else:
@@ -654,7 +735,7 @@ def pagina_consulta_pontuacao(session):
         st.subheader("📂 Registros anteriores")
         regs_ant_sel, total_ant = exibir_tabela_registros(
             registros_anteriores, tarefas_dict, inicio_mes, fim_mes,
-            mostrar_utilizados, "ant", session  # session adicionado
+            mostrar_utilizados, "ant", session, consumo
         )
         registros_selecionados.extend(regs_ant_sel)
         total_selecionado += total_ant
@@ -662,7 +743,7 @@ def pagina_consulta_pontuacao(session):
     st.subheader("📋 Registros do mês atual")
     regs_mes_sel, total_mes = exibir_tabela_registros(
         registros_principais, tarefas_dict, inicio_mes, fim_mes,
-        mostrar_utilizados, "sel", session  # session adicionado
+        mostrar_utilizados, "sel", session, consumo
     )
     registros_selecionados.extend(regs_mes_sel)
     total_selecionado += total_mes
@@ -670,54 +751,11 @@ def pagina_consulta_pontuacao(session):
     # -------------------------
     # 📊 Cálculos de métricas
     # -------------------------
-    total_realizado = sum(
-        t.pontos for r in registros_principais
-        if (t := tarefas_dict.get(r.tarefa_id))
-    )
-
-    registros_mes_utilizados = (
-        session.query(MetaMensalRegistro)
-        .join(RegistroDePontuacao, MetaMensalRegistro.registro_id == RegistroDePontuacao.id)
-        .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-        .filter(
-            RegistroDePontuacao.usuario_id == usuario_id,
-            RegistroDePontuacao.data_execucao >= inicio_mes,
-            RegistroDePontuacao.data_execucao < fim_mes,
-            MetaMensal.usuario_id == usuario_id,
-            MetaMensal.ano_mes == periodo,
-            MetaMensal.status == "confirmado"
-        )
-        .all()
-    )
-    pontos_utilizados_atual = sum(
-        tarefas_dict[
-            session.query(RegistroDePontuacao).get(r.registro_id).tarefa_id
-        ].pontos
-        for r in registros_mes_utilizados
-    )
-
-    registros_antigos_utilizados = (
-        session.query(MetaMensalRegistro)
-        .join(RegistroDePontuacao, MetaMensalRegistro.registro_id == RegistroDePontuacao.id)
-        .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-        .filter(
-            RegistroDePontuacao.usuario_id == usuario_id,
-            RegistroDePontuacao.data_execucao < inicio_mes,
-            MetaMensal.usuario_id == usuario_id,
-            MetaMensal.ano_mes == periodo,
-            MetaMensal.status == "confirmado"
-        )
-        .all()
-    )
-    utilizados_antigos = sum(
-        tarefas_dict[
-            session.query(RegistroDePontuacao).get(r.registro_id).tarefa_id
-        ].pontos
-        for r in registros_antigos_utilizados
-    )
-
-    total_utilizado = pontos_utilizados_atual + utilizados_antigos
-    saldo_mensal = total_realizado - pontos_utilizados_atual
+    total_realizado = metricas["realizado"]
+    pontos_utilizados_atual = metricas["utilizado_mes"]
+    utilizados_antigos = metricas["utilizado_antigo"]
+    total_utilizado = metricas["total_utilizado"]
+    saldo_mensal = metricas["saldo_mensal"]
 
     # -------------------------
     # 🎨 Exibição das métricas
@@ -745,16 +783,15 @@ def pagina_consulta_pontuacao(session):
         if not registros_selecionados:
             st.warning("Nenhum registro selecionado.")
         else:
+            # Reconsulta o banco: outro usuário pode ter confirmado nesse meio tempo
+            quantidades = {r.id: r.quantidade or 1 for r in registros}
+            consumo_atual = quantidades_utilizadas(
+                session, [registro_id for (registro_id, _, _) in registros_selecionados]
+            )
             registros_ja_usados = [
                 registro_id
-                for (registro_id, _) in registros_selecionados
-                if session.query(MetaMensalRegistro)
-                          .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
-                          .filter(
-                              MetaMensalRegistro.registro_id == registro_id,
-                              MetaMensal.status == "confirmado"
-                          )
-                          .first()
+                for (registro_id, _, qtd) in registros_selecionados
+                if qtd > quantidades[registro_id] - consumo_atual.get(registro_id, (0, 0))[1]
             ]
             if registros_ja_usados:
                 st.warning("Um ou mais registros selecionados já foram utilizados.")
@@ -765,21 +802,39 @@ def pagina_consulta_pontuacao(session):
         gerar_pdf(tarefas_dict, periodo, nome_fiscal, session)
 
     if st.button("📄 Gerar PDF Pontos Totais"):
-        registros_utilizados = registros_mes_utilizados + registros_antigos_utilizados
+        registros_usados_periodo = (
+            session.query(RegistroDePontuacao, MetaMensalRegistro.quantidade_utilizada)
+            .join(MetaMensalRegistro, MetaMensalRegistro.registro_id == RegistroDePontuacao.id)
+            .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
+            .filter(
+                RegistroDePontuacao.usuario_id == usuario_id,
+                RegistroDePontuacao.data_execucao < fim_mes,
+                MetaMensal.usuario_id == usuario_id,
+                MetaMensal.ano_mes == periodo,
+                MetaMensal.status == "confirmado"
+            )
+            .all()
+        )
         usuario_obj = session.query(Usuario).get(usuario_id)
 
         gerar_pdf_pontos_totais_detalhado(
             tarefas_dict=tarefas_dict,
-            registros_utilizados=[r.registro for r in registros_utilizados],
+            registros_utilizados=registros_usados_periodo,
             registros=registros,
             registros_principais=registros_principais,
-            pontos_expirados=sum(r.pontos for r in expirando_este_mes),
+            pontos_expirados=metricas["expirando"],
             periodo=periodo,
             usuario_obj=usuario_obj,
             inicio_mes=inicio_mes,
             session=session
         )
 
+    # 📦 Relatórios de toda a equipe/setor visível em um ZIP
+    if nivel_acesso != "fiscal":
+        with st.expander("📦 Relatórios em lote"):
+            from pdf_lote import secao_pdf_lote
+            secao_pdf_lote(session, usuarios, periodo)
+
 
 
 
@@ -0,0 +1,472 @@
+# cubo_relatorios.py
+
+"""
+Cubo de relatórios: pontos gerados, utilizados e expirados por
+usuário × mês × tarefa (tabela cubo_relatorios).
+
+O cubo é mantido junto com o livro-razão mensal: atualizar_saldos_mensais
+recalcula as mesmas chaves (usuario_id, 'YYYY-MM') aqui, na mesma
+transação. A aba Relatórios lê só esta tabela, já agregada, mantida em
+memória até o próximo commit que a altere (ou até PRODUTIVIDADE_CUBO_TTL
+segundos, para gravações feitas por outros processos), e monta as tabelas dinâmicas
+por setor, equipe, usuário ou tarefa com NumPy/pandas, sem varrer os
+registros de pontuação.
+
+Uso:
+    python cubo_relatorios.py    reconstrói o cubo inteiro (backfill)
+"""
+
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from modelos import (
+    Usuario, Setor, Equipe, Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro, CuboRelatorio
+)
+from helpers import unidades_disponiveis, usuarios_visiveis
+
+MEDIDAS = ("gerado", "utilizado", "expirado", "saldo")
+DIMENSOES = {"setor": "Setor", "equipe": "Equipe", "usuario": "Usuário", "tarefa": "Tarefa"}
+PERIODOS = {"mes": "Mês", "trimestre": "Trimestre", "ano": "Ano"}
+# Validade do cubo em memória: scripts (importação, compactação, reconstrução)
+# gravam em outro processo, sem passar pelo after_commit deste
+TTL_CUBO_S = float(os.getenv("PRODUTIVIDADE_CUBO_TTL", "60"))
+
+
+def _utilizado_por_tarefa(session, usuario_ids=None, mes_min=None, mes_max=None):
+    """
+    MetaMensal.pontos_utilizados (o mesmo valor do livro-razão) repartido
+    entre as tarefas da meta, na proporção dos pontos de cada tarefa nos
+    registros vinculados. Metas sem vínculos não têm tarefa e ficam de fora.
+    """
+    pontos = func.sum(RegistroDePontuacao.pontos * func.coalesce(MetaMensalRegistro.quantidade_utilizada, 1))
+    por_meta_tarefa = select(
+        MetaMensal.usuario_id,
+        MetaMensal.ano_mes,
+        MetaMensal.pontos_utilizados,
+        RegistroDePontuacao.tarefa_id,
+        pontos.label("pontos"),
+        func.sum(pontos).over(partition_by=MetaMensal.id).label("pontos_meta"),
+    ).join(
+        MetaMensalRegistro, MetaMensalRegistro.meta_id == MetaMensal.id
+    ).join(
+        RegistroDePontuacao, MetaMensalRegistro.registro_id == RegistroDePontuacao.id
+    ).where(
+        MetaMensal.status == "confirmado"
+    ).group_by(MetaMensal.id, RegistroDePontuacao.tarefa_id)
+
+    if usuario_ids is not None:
+        por_meta_tarefa = por_meta_tarefa.where(MetaMensal.usuario_id.in_(usuario_ids))
+    if mes_min is not None:
+        por_meta_tarefa = por_meta_tarefa.where(MetaMensal.ano_mes.between(mes_min, mes_max))
+
+    rateio = por_meta_tarefa.subquery()
+    return session.query(
+        rateio.c.usuario_id, rateio.c.ano_mes, rateio.c.tarefa_id,
+        func.sum(rateio.c.pontos_utilizados * rateio.c.pontos / rateio.c.pontos_meta)
+    ).filter(rateio.c.pontos_meta > 0).group_by(rateio.c.usuario_id, rateio.c.ano_mes, rateio.c.tarefa_id)
+
+
+def _calcular_celulas(session, usuario_ids=None, mes_min=None, mes_max=None):
+    """
+    Soma gerado, utilizado e expirado por (usuario_id, mês, tarefa_id) direto
+    no banco, com as mesmas regras do livro-razão. Sem filtros, calcula tudo.
+    """
+    mes_execucao = func.strftime("%Y-%m", RegistroDePontuacao.data_execucao)
+    mes_expiracao = func.strftime("%Y-%m", RegistroDePontuacao.data_expiracao)
+
+    quantidade = func.coalesce(RegistroDePontuacao.quantidade, 1)
+    disponivel = unidades_disponiveis()
+
+    gerado = session.query(
+        RegistroDePontuacao.usuario_id, mes_execucao, RegistroDePontuacao.tarefa_id,
+        func.sum(RegistroDePontuacao.pontos * quantidade)
+    ).group_by(RegistroDePontuacao.usuario_id, mes_execucao, RegistroDePontuacao.tarefa_id)
+    utilizado = _utilizado_por_tarefa(session, usuario_ids, mes_min, mes_max)
+    expirado = session.query(
+        RegistroDePontuacao.usuario_id, mes_expiracao, RegistroDePontuacao.tarefa_id,
+        func.sum(RegistroDePontuacao.pontos * disponivel)
+    ).filter(disponivel > 0).group_by(RegistroDePontuacao.usuario_id, mes_expiracao, RegistroDePontuacao.tarefa_id)
+
+    if usuario_ids is not None:
+        gerado = gerado.filter(RegistroDePontuacao.usuario_id.in_(usuario_ids))
+        expirado = expirado.filter(RegistroDePontuacao.usuario_id.in_(usuario_ids))
+    if mes_min is not None:
+        # Intervalo de datas para aproveitar os índices por usuário/data
+        inicio = datetime.strptime(mes_min, "%Y-%m").date()
+        fim = datetime.strptime(mes_max, "%Y-%m").date() + relativedelta(months=1)
+        gerado = gerado.filter(
+            RegistroDePontuacao.data_execucao >= inicio,
+            RegistroDePontuacao.data_execucao < fim
+        )
+        expirado = expirado.filter(
+            RegistroDePontuacao.data_expiracao >= inicio,
+            RegistroDePontuacao.data_expiracao < fim
+        )
+
+    celulas = {}
+    for posicao, query in enumerate((gerado, utilizado, expirado)):
+        for usuario_id, mes, tarefa_id, total in query.all():
+            celulas.setdefault((usuario_id, mes, tarefa_id), [0, 0, 0])[posicao] = total or 0
+    return celulas
+
+
+def _linhas(celulas):
+    return [
+        {"usuario_id": usuario_id, "ano_mes": mes, "tarefa_id": tarefa_id,
+         "gerado": gerado, "utilizado": utilizado, "expirado": expirado}
+        for (usuario_id, mes, tarefa_id), (gerado, utilizado, expirado) in celulas.items()
+        if gerado or utilizado or expirado
+    ]
+
+
+def atualizar_cubo(session, chaves):
+    """
+    Recalcula as células do cubo dos pares (usuario_id, mês) informados.
+    Não faz commit: é chamada por atualizar_saldos_mensais, na transação
+    de quem gravou os dados.
+    """
+    chaves = {(uid, mes) for uid, mes in chaves if uid is not None and mes}
+    if not chaves:
+        return
+
+    session.flush()
+    usuario_ids = {uid for uid, _ in chaves}
+    meses = sorted({mes for _, mes in chaves})
+    celulas = _calcular_celulas(session, usuario_ids, meses[0], meses[-1])
+
+    # Regrava usuários × meses: o cálculo acima cobre todos esses pares
+    session.execute(
+        delete(CuboRelatorio).where(
+            CuboRelatorio.usuario_id.in_(usuario_ids),
+            CuboRelatorio.ano_mes.in_(meses)
+        )
+    )
+    linhas = [linha for linha in _linhas(celulas) if linha["ano_mes"] in meses]
+    if linhas:
+        session.execute(insert(CuboRelatorio), linhas)
+    session.info["cubo_alterado"] = True
+
+
+def recalcular_cubo(session):
+    """Apaga e recalcula o cubo inteiro na sessão informada, sem commit."""
+    session.execute(delete(CuboRelatorio))
+    linhas = _linhas(_calcular_celulas(session))
+    if linhas:
+        session.execute(insert(CuboRelatorio), linhas)
+    session.info["cubo_alterado"] = True
+    return len(linhas)
+
+
+def reconstruir_cubo(session=None):
+    """Reconstrói o cubo a partir dos registros e metas e faz o commit."""
+    propria_sessao = session is None
+    if propria_sessao:
+        session = SessionLocal()
+
+    try:
+        total = recalcular_cubo(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if propria_sessao:
+            session.close()
+
+    return total
+
+
+def preencher_cubo_se_vazio():
+    """Faz o backfill do cubo em bancos que ainda não o possuem."""
+    session = SessionLocal()
+    try:
+        vazio = session.query(CuboRelatorio.id).first() is None
+        tem_dados = session.query(RegistroDePontuacao.id).first() is not None
+    finally:
+        session.close()
+    if vazio and tem_dados:
+        return reconstruir_cubo()
+    return 0
+
+
+# -------------------------------
+# 🧠 Cubo em memória
+# -------------------------------
+_trava_cubo = threading.Lock()
+_cubo_em_memoria = None
+_cubo_lido_em = 0.0
+_geracao_cubo = 0
+
+
+def invalidar_cubo():
+    """Descarta o cubo em memória; a próxima leitura relê a tabela."""
+    global _cubo_em_memoria, _geracao_cubo
+    with _trava_cubo:
+        _geracao_cubo += 1
+        _cubo_em_memoria = None
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidar_se_alterado(session):
+    # atualizar_cubo/recalcular_cubo marcam a sessão; a invalidação só
+    # acontece quando a transação termina, para não guardar dados pela metade
+    if session.info.pop("cubo_alterado", False):
+        invalidar_cubo()
+
+
+def _ler_cubo(session):
+    """Tabela cubo_relatorios inteira (ids e valores), lida uma vez por geração ou TTL."""
+    global _cubo_em_memoria, _cubo_lido_em
+    cubo = _cubo_em_memoria
+    if cubo is not None and time.monotonic() - _cubo_lido_em > TTL_CUBO_S:
+        cubo = None
+    if cubo is None:
+        geracao = _geracao_cubo
+        lido_em = time.monotonic()
+        consulta = select(
+            CuboRelatorio.usuario_id,
+            CuboRelatorio.tarefa_id,
+            CuboRelatorio.ano_mes.label("mes"),
+            CuboRelatorio.gerado,
+            CuboRelatorio.utilizado,
+            CuboRelatorio.expirado,
+        ).order_by(CuboRelatorio.ano_mes)
+        cubo = pd.read_sql(consulta, session.connection()).astype(
+            {"usuario_id": "int64", "tarefa_id": "int64", "mes": "object",
+             "gerado": "float64", "utilizado": "float64", "expirado": "float64"}
+        )
+        cubo["saldo"] = cubo["gerado"] - cubo["utilizado"] - cubo["expirado"]
+        with _trava_cubo:
+            # Não guarda um cubo lido antes de uma invalidação
+            if geracao == _geracao_cubo:
+                _cubo_em_memoria, _cubo_lido_em = cubo, lido_em
+    return cubo
+
+
+# -------------------------------
+# 📊 Leitura e tabelas dinâmicas
+# -------------------------------
+def _dimensoes_usuarios(session, usuario_ids):
+    consulta = select(
+        Usuario.id.label("usuario_id"),
+        Usuario.nome.label("usuario"),
+        func.coalesce(Setor.nome, "Sem setor").label("setor"),
+        func.coalesce(Equipe.nome, "Sem equipe").label("equipe"),
+    ).outerjoin(
+        Setor, Setor.id == Usuario.setor_id
+    ).outerjoin(
+        Equipe, Equipe.id == Usuario.equipe_id
+    ).where(Usuario.id.in_(usuario_ids))
+    return pd.read_sql(consulta, session.connection()).set_index("usuario_id")
+
+
+def _dimensoes_tarefas(session, tarefa_ids):
+    consulta = select(
+        Tarefa.id.label("tarefa_id"),
+        (Tarefa.codigo + " - " + Tarefa.descricao).label("tarefa"),
+    ).where(Tarefa.id.in_(tarefa_ids))
+    return pd.read_sql(consulta, session.connection()).set_index("tarefa_id")
+
+
+def _a_expirar_no_mes(session, usuario_ids, hoje):
+    """
+    Pontos ainda disponíveis que vencem depois de hoje, dentro do mês atual,
+    por (usuario_id, tarefa_id). O cubo guarda o expirado pelo mês de
+    expiração; estes pontos ainda não expiraram.
+    """
+    disponivel = unidades_disponiveis()
+    consulta = select(
+        RegistroDePontuacao.usuario_id,
+        RegistroDePontuacao.tarefa_id,
+        func.sum(RegistroDePontuacao.pontos * disponivel).label("a_expirar"),
+    ).where(
+        RegistroDePontuacao.usuario_id.in_(usuario_ids),
+        RegistroDePontuacao.data_expiracao > hoje,
+        RegistroDePontuacao.data_expiracao < hoje.replace(day=1) + relativedelta(months=1),
+        disponivel > 0
+    ).group_by(RegistroDePontuacao.usuario_id, RegistroDePontuacao.tarefa_id)
+    return pd.read_sql(consulta, session.connection()).set_index(["usuario_id", "tarefa_id"])["a_expirar"]
+
+
+def carregar_cubo(session, usuario_ids=None, mes_inicial=None, mes_final=None, hoje=None):
+    """
+    Recorte do cubo em memória com os nomes de usuário, setor, equipe e
+    tarefa. Os nomes são lidos a cada chamada (são poucas linhas), então
+    trocas de equipe ou setor aparecem sem precisar reconstruir o cubo.
+
+    O recorte termina no mês atual e o expirado conta só os pontos vencidos
+    até hoje: os meses seguintes do cubo têm apenas pontos que ainda vão
+    expirar.
+
+    Retorno:
+        - DataFrame com usuario_id, tarefa_id, mes, gerado, utilizado,
+          expirado, saldo, usuario, setor, equipe e tarefa
+    """
+    hoje = hoje or date.today()
+    mes_atual = hoje.strftime("%Y-%m")
+    mes_final = min(mes_final, mes_atual) if mes_final else mes_atual
+    cubo = _ler_cubo(session)
+
+    filtro = np.ones(len(cubo), dtype=bool)
+    if usuario_ids is not None:
+        filtro &= np.isin(cubo["usuario_id"].to_numpy(), np.fromiter(usuario_ids, dtype="int64"))
+    # O cubo está em ordem de mês: o intervalo vira um fatiamento por busca binária
+    meses = cubo["mes"].to_numpy()
+    inicio = np.searchsorted(meses, mes_inicial, side="left") if mes_inicial else 0
+    fim = np.searchsorted(meses, mes_final, side="right") if mes_final else len(cubo)
+    filtro[:inicio] = False
+    filtro[fim:] = False
+
+    df = cubo[filtro]
+    atual = (df["mes"] == mes_atual).to_numpy()
+    if atual.any():
+        df = df.copy()
+        a_expirar = _a_expirar_no_mes(session, df.loc[atual, "usuario_id"].unique().tolist(), hoje)
+        chaves = pd.MultiIndex.from_arrays([df.loc[atual, "usuario_id"], df.loc[atual, "tarefa_id"]])
+        desconto = a_expirar.reindex(chaves, fill_value=0).to_numpy(dtype="float64")
+        df.loc[atual, "expirado"] = (df.loc[atual, "expirado"].to_numpy() - desconto).clip(min=0)
+        df["saldo"] = df["gerado"] - df["utilizado"] - df["expirado"]
+        df = df[(df["gerado"] != 0) | (df["utilizado"] != 0) | (df["expirado"] != 0)]
+
+    usuarios = _dimensoes_usuarios(session, df["usuario_id"].unique().tolist())
+    tarefas = _dimensoes_tarefas(session, df["tarefa_id"].unique().tolist())
+
+    pos_usuario = usuarios.index.get_indexer(df["usuario_id"])
+    pos_tarefa = tarefas.index.get_indexer(df["tarefa_id"])
+    encontrados = (pos_usuario >= 0) & (pos_tarefa >= 0)
+    df = df[encontrados].copy()
+    pos_usuario, pos_tarefa = pos_usuario[encontrados], pos_tarefa[encontrados]
+
+    # Dimensões como categorias montadas pelos códigos: o texto não é
+    # copiado para cada linha e o groupby agrupa por inteiros
+    for coluna in ("usuario", "setor", "equipe"):
+        df[coluna] = _categoria(usuarios[coluna], pos_usuario)
+    df["tarefa"] = _categoria(tarefas["tarefa"], pos_tarefa)
+    df["mes"] = df["mes"].astype("category")
+    return df
+
+
+def _categoria(nomes, posicoes):
+    categorias = pd.Index(nomes.unique())
+    return pd.Categorical.from_codes(categorias.get_indexer(nomes)[posicoes], categories=categorias)
+
+
+def meses_disponiveis(session, hoje=None):
+    """Meses ('YYYY-MM') presentes no cubo até o mês atual, em ordem."""
+    mes_atual = (hoje or date.today()).strftime("%Y-%m")
+    return sorted(mes for mes in _ler_cubo(session)["mes"].unique() if mes <= mes_atual)
+
+
+def _rotulo_periodo(meses, periodo):
+    """Converte a coluna de meses ('YYYY-MM') para mês, trimestre ('YYYY-T1') ou ano."""
+    if periodo == "mes":
+        return meses
+    rotulos = {}
+    for mes in meses.cat.categories:
+        if periodo == "ano":
+            rotulos[mes] = mes[:4]
+        else:
+            rotulos[mes] = f"{mes[:4]}-T{(int(mes[5:7]) - 1) // 3 + 1}"
+    # Mapeia só as categorias (poucos meses), não cada linha
+    return meses.map(rotulos).astype("category")
+
+
+def pivotar_cubo(df, linhas="setor", periodo="mes", medida="gerado", total=True):
+    """
+    Tabela dinâmica do cubo: uma linha por setor/equipe/usuário/tarefa e uma
+    coluna por mês, trimestre ou ano, somando a medida escolhida.
+
+    Retorno:
+        - DataFrame com a matriz (e a coluna Total, se total=True)
+    """
+    if linhas not in DIMENSOES:
+        raise ValueError(f"Dimensão inválida: {linhas}")
+    if periodo not in PERIODOS:
+        raise ValueError(f"Período inválido: {periodo}")
+    if medida not in MEDIDAS:
+        raise ValueError(f"Medida inválida: {medida}")
+
+    matriz = df.groupby(
+        [df[linhas].rename(DIMENSOES[linhas]), _rotulo_periodo(df["mes"], periodo).rename(PERIODOS[periodo])],
+        observed=True
+    )[medida].sum().unstack(fill_value=0)
+    matriz = matriz[sorted(matriz.columns)]
+    matriz.columns = matriz.columns.astype(str)
+    matriz.index = matriz.index.astype(str)
+    if total:
+        matriz["Total"] = matriz.sum(axis=1)
+        matriz = matriz.sort_values("Total", ascending=False)
+    return matriz
+
+
+# -------------------------------
+# 🖥️ Interface (aba Relatórios)
+# -------------------------------
+def pagina_relatorios(session):
+    import streamlit as st
+    from auth import exigir_login
+
+    exigir_login()
+    st.subheader("📑 Relatórios")
+
+    usuario_logado = session.query(Usuario).get(st.session_state.usuario_id)
+    usuarios = usuarios_visiveis(usuario_logado, session)
+    if not usuarios:
+        st.warning("Nenhum usuário disponível.")
+        st.stop()
+
+    meses = meses_disponiveis(session)
+    if not meses:
+        st.info("Nenhum dado disponível para relatórios.")
+        return
+
+    # ⚙️ Recorte e agrupamento (padrão: últimos 12 meses com dados)
+    mes_inicial, mes_final = st.select_slider(
+        "Período", options=meses, value=(meses[max(0, len(meses) - 12)], meses[-1])
+    )
+
+    col1, col2, col3 = st.columns(3)
+    linhas = col1.selectbox("Linhas", list(DIMENSOES), format_func=DIMENSOES.get)
+    periodo = col2.selectbox("Colunas", list(PERIODOS), format_func=PERIODOS.get)
+    medida = col3.selectbox("Medida", MEDIDAS, format_func=str.capitalize)
+
+    df = carregar_cubo(session, [u.id for u in usuarios], mes_inicial, mes_final)
+    if df.empty:
+        st.info("Nenhum dado no período selecionado.")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Gerado", f"{df['gerado'].sum():.0f} pts")
+    c2.metric("Utilizado", f"{df['utilizado'].sum():.0f} pts")
+    c3.metric("Expirado", f"{df['expirado'].sum():.0f} pts")
+    c4.metric("Saldo", f"{df['saldo'].sum():.0f} pts")
+
+    matriz = pivotar_cubo(df, linhas, periodo, medida)
+    st.dataframe(
+        matriz,
+        use_container_width=True,
+        column_config={col: st.column_config.NumberColumn(format="%.0f") for col in matriz.columns}
+    )
+    st.download_button(
+        "📥 Baixar CSV",
+        data=matriz.to_csv(sep=";", decimal=",").encode("utf-8-sig"),
+        file_name=f"relatorio_{medida}_por_{linhas}_{mes_inicial}_{mes_final}.csv",
+        mime="text/csv"
+    )
+
+
+if __name__ == "__main__":
+    from db import init_db
+    init_db()
+    total = reconstruir_cubo()
+    print(f"🧊 {total} células do cubo de relatórios reconstruídas.")
@@ -0,0 +1,258 @@
+# dados_sinteticos.py
+
+"""
+Gerador determinístico (com semente) de dados sintéticos para medir o
+desempenho das páginas com volume realista: setores, equipes, gestores,
+chefes, milhares de fiscais, milhões de registros e metas confirmadas que
+consomem esses registros em ordem de execução, como na Consulta de
+Pontuação.
+
+Os registros são gravados em lotes com insert em massa e ids já definidos,
+sem carregar objetos ORM. Ao final o livro-razão e o cubo de relatórios são
+reconstruídos. Nunca grava no controle_produtividade.db.
+
+Uso:
+    python dados_sinteticos.py destino.db [fiscais] [registros_por_fiscal] [semente]
+
+Depois, para abrir o painel com o banco gerado:
+    PRODUTIVIDADE_DATABASE_URL=sqlite:///destino.db streamlit run painel.py
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from db import criar_engine, atualizar_indices
+from modelos import Base, Usuario, Setor, Equipe, Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro
+from saldos_mensais import reconstruir_saldos_mensais
+from tabela_tarefas import TABELA_TAREFAS
+
+TAMANHO_LOTE = 50000
+BANCO_PRODUCAO = "controle_produtividade.db"
+
+
+def _pesos_tarefas(tarefas):
+    """Tarefas baratas são frequentes; as de pontuação muito alta, raras."""
+    return [0.001 if pontos >= 100 else 1 / max(pontos, 1) for _, pontos in tarefas]
+
+
+def _criar_estrutura(session, setores, equipes_por_setor, fiscais):
+    """Cria tarefas, setores, equipes e usuários; retorna as tarefas e os fiscais."""
+    session.add_all([
+        Tarefa(codigo=codigo, descricao=descricao, pontos=pontos, ativa=True)
+        for codigo, descricao, pontos in TABELA_TAREFAS
+    ])
+    session.add(Usuario(nome="Administrador", login="admin", senha_hash="x", papel="admin"))
+    session.flush()
+
+    equipes = []
+    for s in range(setores):
+        setor = Setor(nome=f"Setor {s + 1}")
+        session.add(setor)
+        session.flush()
+        gestor = Usuario(nome=f"Gestor {s + 1}", login=f"gestor{s + 1}", senha_hash="x",
+                         papel="gestor", setor_id=setor.id)
+        session.add(gestor)
+        for e in range(equipes_por_setor):
+            equipe = Equipe(nome=f"Equipe {s + 1}.{e + 1}")
+            session.add(equipe)
+            session.flush()
+            chefe = Usuario(nome=f"Chefe {s + 1}.{e + 1}", login=f"chefe{s + 1}_{e + 1}", senha_hash="x",
+                            papel="chefe", setor_id=setor.id, equipe_id=equipe.id, lider_id=gestor.id)
+            session.add(chefe)
+            session.flush()
+            equipes.append((setor.id, equipe.id, chefe.id))
+
+    linhas = [
+        {
+            "nome": f"Fiscal {f + 1:05d}", "login": f"fiscal{f + 1}", "matricula": f"{100000 + f}",
+            "senha_hash": "x", "papel": "fiscal", "ativo": True, "primeiro_acesso": False,
+            "setor_id": equipes[f % len(equipes)][0], "equipe_id": equipes[f % len(equipes)][1],
+            "lider_id": equipes[f % len(equipes)][2],
+        }
+        for f in range(fiscais)
+    ]
+    session.execute(insert(Usuario), linhas)
+
+    tarefas = [(t.id, t.pontos) for t in session.query(Tarefa).filter(Tarefa.pontos > 0)]
+    fiscal_ids = [uid for (uid,) in session.query(Usuario.id).filter(Usuario.papel == "fiscal").order_by(Usuario.id)]
+    return tarefas, fiscal_ids
+
+
+def _registros_do_fiscal(rnd, usuario_id, tarefas, pesos, quantidade, inicio, dias, proximo_id, processo):
+    escolhidas = rnd.choices(tarefas, weights=pesos, k=quantidade)
+    registros = []
+    for tarefa_id, pontos in escolhidas:
+        execucao = inicio + timedelta(days=rnd.randrange(dias))
+        processo += 1
+        registros.append({
+            "id": proximo_id + len(registros), "usuario_id": usuario_id, "tarefa_id": tarefa_id,
+            "data_execucao": execucao, "data_expiracao": execucao + timedelta(days=365),
+            "pontos": pontos, "quantidade": 1 if rnd.random() < 0.85 else rnd.randint(2, 5),
+            "usado_para_meta": False, "numero_processo": f"{execucao.year}.{processo:07d}",
+        })
+    registros.sort(key=lambda r: r["data_execucao"])
+    return registros, processo
+
+
+def _metas_do_fiscal(rnd, usuario_id, registros, meses, taxa_uso, proximo_meta_id):
+    """
+    Metas confirmadas mês a mês, consumindo as unidades disponíveis mais
+    antigas (executadas até o fim do mês e ainda não expiradas no início).
+    """
+    disponivel = [r["quantidade"] for r in registros]
+    metas, vinculos = [], []
+    primeiro = 0  # registros antes deste índice já expiraram ou foram esgotados
+
+    for inicio_mes in meses:
+        fim_mes = inicio_mes + relativedelta(months=1)
+        if rnd.random() >= taxa_uso:
+            continue
+        while primeiro < len(registros) and (
+            registros[primeiro]["data_expiracao"] < inicio_mes or disponivel[primeiro] == 0
+        ):
+            primeiro += 1
+
+        alvo = rnd.uniform(0.5, 1.0) * sum(
+            r["pontos"] * disponivel[i]
+            for i, r in enumerate(registros[primeiro:], primeiro)
+            if r["data_execucao"] < fim_mes and r["data_expiracao"] >= inicio_mes
+        )
+        meta_id = proximo_meta_id + len(metas)
+        usado = 0
+        for i in range(primeiro, len(registros)):
+            r = registros[i]
+            if usado >= alvo or r["data_execucao"] >= fim_mes:
+                break
+            if disponivel[i] == 0 or r["data_expiracao"] < inicio_mes:
+                continue
+            unidades = min(disponivel[i], max(1, int((alvo - usado) // r["pontos"])))
+            disponivel[i] -= unidades
+            usado += r["pontos"] * unidades
+            vinculos.append({"meta_id": meta_id, "registro_id": r["id"], "quantidade_utilizada": unidades})
+
+        if usado:
+            metas.append({
+                "id": meta_id, "usuario_id": usuario_id, "ano_mes": inicio_mes.strftime("%Y-%m"),
+                "pontos_utilizados": usado, "status": "confirmado",
+                "data_validacao": fim_mes,
+            })
+    return metas, vinculos
+
+
+def gerar_dados(fabrica, fiscais=2000, registros_por_fiscal=500, setores=3, equipes_por_setor=6,
+                meses=24, taxa_uso=0.7, semente=42, hoje=None):
+    """
+    Preenche um banco vazio com dados sintéticos reprodutíveis.
+
+    Parâmetros:
+        - fabrica: fábrica de sessões do banco de destino (já com as tabelas)
+        - meses: janela de execução dos registros, terminando em hoje
+        - taxa_uso: chance de o fiscal confirmar meta em cada mês fechado
+
+    Retorno:
+        - dict com as contagens geradas e o tempo de cada etapa
+    """
+    rnd = random.Random(semente)
+    hoje = hoje or date.today()
+    inicio = hoje.replace(day=1) - relativedelta(months=meses - 1)
+    dias = (hoje - inicio).days + 1
+    # Metas só nos meses já fechados; o mês corrente fica disponível para a Consulta
+    meses_fechados = [inicio + relativedelta(months=m) for m in range(meses - 1)]
+
+    tempos = {}
+    session = fabrica()
+    try:
+        marco = time.perf_counter()
+        tarefas, fiscal_ids = _criar_estrutura(session, setores, equipes_por_setor, fiscais)
+        pesos = _pesos_tarefas(tarefas)
+        tempos["estrutura_s"] = time.perf_counter() - marco
+
+        marco = time.perf_counter()
+        total_registros = total_metas = total_vinculos = 0
+        lote_registros, lote_metas, lote_vinculos = [], [], []
+        processo = 0
+
+        def gravar():
+            # Ordem das chaves estrangeiras: registros, metas, vínculos
+            for modelo, lote in (
+                (RegistroDePontuacao, lote_registros), (MetaMensal, lote_metas), (MetaMensalRegistro, lote_vinculos)
+            ):
+                if lote:
+                    session.execute(insert(modelo), lote)
+                    lote.clear()
+
+        for usuario_id in fiscal_ids:
+            registros, processo = _registros_do_fiscal(
+                rnd, usuario_id, tarefas, pesos, registros_por_fiscal, inicio, dias, total_registros + 1, processo
+            )
+            metas, vinculos = _metas_do_fiscal(
+                rnd, usuario_id, registros, meses_fechados, taxa_uso, total_metas + 1
+            )
+            lote_registros.extend(registros)
+            lote_metas.extend(metas)
+            lote_vinculos.extend(vinculos)
+            total_registros += len(registros)
+            total_metas += len(metas)
+            total_vinculos += len(vinculos)
+            if len(lote_registros) >= TAMANHO_LOTE:
+                gravar()
+        gravar()
+        session.commit()
+        tempos["registros_s"] = time.perf_counter() - marco
+
+        marco = time.perf_counter()
+        linhas_saldo = reconstruir_saldos_mensais(session)
+        tempos["saldos_s"] = time.perf_counter() - marco
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    return {
+        "fiscais": len(fiscal_ids),
+        "registros": total_registros,
+        "metas": total_metas,
+        "vinculos": total_vinculos,
+        "linhas_saldo_mensal": linhas_saldo,
+        **{chave: round(valor, 2) for chave, valor in tempos.items()},
+    }
+
+
+def criar_banco_sintetico(caminho, **parametros):
+    """Cria o arquivo SQLite em caminho e o preenche com gerar_dados."""
+    if os.path.basename(caminho) == BANCO_PRODUCAO:
+        raise ValueError("O gerador não grava no banco de produção.")
+    if os.path.exists(caminho):
+        raise ValueError(f"O arquivo {caminho} já existe; escolha outro destino.")
+
+    engine = criar_engine(f"sqlite:///{os.path.abspath(caminho)}")
+    try:
+        Base.metadata.create_all(bind=engine)
+        atualizar_indices(engine)
+        return gerar_dados(sessionmaker(autocommit=False, autoflush=False, bind=engine), **parametros)
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python dados_sinteticos.py destino.db [fiscais] [registros_por_fiscal] [semente]")
+        sys.exit(1)
+
+    parametros = dict(zip(("fiscais", "registros_por_fiscal", "semente"), (int(a) for a in sys.argv[2:5])))
+    try:
+        resumo = criar_banco_sintetico(sys.argv[1], **parametros)
+    except ValueError as erro:
+        print(f"❌ {erro}")
+        sys.exit(1)
+
+    for chave, valor in resumo.items():
+        print(f"{chave}: {valor}")
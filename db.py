@@ -1,17 +1,80 @@
 # db.py
-from sqlalchemy import create_engine
+import os
+from contextlib import contextmanager
+from datetime import date
+from sqlalchemy import create_engine, event, select
 from sqlalchemy.orm import sessionmaker
-from modelos import Base
+from modelos import Base, RegistroDePontuacao, MetaMensal, MetaMensalRegistro
+from monitor_consultas import MONITORAR_CONSULTAS, instalar_monitor
+
+# URL do banco - mesma que está no alembic.ini (pode ser trocada por variável de ambiente)
+DATABASE_URL = os.getenv("PRODUTIVIDADE_DATABASE_URL", "sqlite:///./controle_produtividade.db")
+
+# Pool de conexões: cada rerun do Streamlit pega uma conexão e a devolve ao fechar a sessão
+POOL_SIZE = int(os.getenv("PRODUTIVIDADE_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("PRODUTIVIDADE_POOL_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = int(os.getenv("PRODUTIVIDADE_POOL_TIMEOUT", "30"))
+
+# Perfis de PRAGMA aplicados a cada nova conexão SQLite
+# - padrao: comportamento original do SQLite (journal DELETE, synchronous FULL)
+# - desempenho: WAL (leitores não bloqueiam escritores), espera em vez de "database is locked"
+# - seguro: WAL com synchronous FULL, para máquinas sujeitas a queda de energia
+PERFIS_SQLITE = {
+    "padrao": {},
+    "desempenho": {
+        "journal_mode": "WAL",
+        "busy_timeout": 5000,
+        "synchronous": "NORMAL",
+        "cache_size": -65536,       # KiB (64 MiB)
+        "mmap_size": 268435456,     # 256 MiB
+        "temp_store": "MEMORY",
+    },
+    "seguro": {
+        "journal_mode": "WAL",
+        "busy_timeout": 10000,
+        "synchronous": "FULL",
+        "temp_store": "MEMORY",
+    },
+}
+PERFIL_SQLITE = os.getenv("PRODUTIVIDADE_SQLITE_PERFIL", "desempenho")
+
+
+def aplicar_perfil_sqlite(engine, perfil=PERFIL_SQLITE):
+    """Registra no engine um hook 'connect' que aplica os PRAGMAs do perfil."""
+    if perfil not in PERFIS_SQLITE:
+        raise ValueError(f"Perfil SQLite desconhecido: {perfil!r} (opções: {', '.join(PERFIS_SQLITE)})")
+    pragmas = PERFIS_SQLITE[perfil]
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(dbapi_conn, _connection_record):
+        cursor = dbapi_conn.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+        cursor.close()
+
+    return engine
+
+
+def criar_engine(url=DATABASE_URL, perfil=PERFIL_SQLITE, monitorar=MONITORAR_CONSULTAS):
+    """Cria um engine com as configurações de pool e de PRAGMA do projeto."""
+    # 'check_same_thread=False' é necessário para SQLite com múltiplas threads (ex.: no Streamlit ou FastAPI).
+    # É seguro porque cada conexão só é usada por uma sessão por vez (ver sessao_escopo).
+    # pool_pre_ping só para servidores: um arquivo SQLite não derruba a conexão, e o
+    # SELECT 1 custaria uma ida ao banco a cada rerun
+    opcoes = {"connect_args": {"check_same_thread": False}, "pool_pre_ping": not str(url).startswith("sqlite")}
+    if url not in ("sqlite://", "sqlite:///:memory:"):
+        opcoes.update(pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    engine = create_engine(url, **opcoes)
+    if engine.dialect.name == "sqlite":
+        aplicar_perfil_sqlite(engine, perfil)
+    if monitorar:
+        # Contador de consultas / N+1 (PRODUTIVIDADE_MONITOR_CONSULTAS=1)
+        instalar_monitor(engine)
+    return engine
 
-# URL do banco - mesma que está no alembic.ini
-DATABASE_URL = "sqlite:///./controle_produtividade.db"
 
 # Cria o engine
-# 'check_same_thread=False' é necessário para SQLite com múltiplas threads (ex.: no Streamlit ou FastAPI)
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+engine = criar_engine()
 
 # Fábrica de sessões
 SessionLocal = sessionmaker(
@@ -20,6 +83,91 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+
+@contextmanager
+def sessao_escopo(fabrica=None):
+    """
+    Abre uma sessão de vida curta (um rerun do Streamlit, um script, uma thread).
+    Desfaz a transação em caso de erro e sempre devolve a conexão ao pool.
+    """
+    session = (fabrica or SessionLocal)()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
 def init_db():
     """Cria as tabelas no banco caso não existam."""
     Base.metadata.create_all(bind=engine)
+    atualizar_indices()
+
+
+def atualizar_indices(bind=None):
+    """
+    Cria nos bancos já existentes os índices declarados em modelos.py.
+    Pode ser executada várias vezes: índices já presentes são ignorados.
+    """
+    bind = bind or engine
+    criados = []
+    for tabela in Base.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            with bind.begin() as conn:
+                if not bind.dialect.has_index(conn, tabela.name, indice.name):
+                    indice.create(bind=conn)
+                    criados.append(indice.name)
+    return criados
+
+
+def verificar_indices(bind=None):
+    """
+    Roda EXPLAIN QUERY PLAN nas consultas usadas pelas páginas e confere se
+    cada uma usa o índice esperado.
+
+    Retorno:
+        - dict {nome_do_indice: (usado, plano)}
+    """
+    bind = bind or engine
+    hoje = date.today()
+    consultas = {
+        "ix_registros_usuario_execucao": select(RegistroDePontuacao).where(
+            RegistroDePontuacao.usuario_id == 1,
+            RegistroDePontuacao.data_execucao >= hoje,
+            RegistroDePontuacao.data_execucao < hoje
+        ),
+        "ix_registros_usuario_expiracao": select(RegistroDePontuacao).where(
+            RegistroDePontuacao.usuario_id == 1,
+            RegistroDePontuacao.data_expiracao >= hoje,
+            RegistroDePontuacao.data_expiracao <= hoje
+        ),
+        "ix_meta_registro_registro_meta": select(MetaMensalRegistro.registro_id).join(
+            MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id
+        ).where(
+            MetaMensalRegistro.registro_id.in_([1, 2, 3]),
+            MetaMensal.status == "confirmado"
+        ),
+        "ix_metas_usuario_anomes_status": select(MetaMensal).where(
+            MetaMensal.usuario_id == 1,
+            MetaMensal.ano_mes == hoje.strftime("%Y-%m"),
+            MetaMensal.status == "confirmado"
+        ),
+    }
+
+    resultado = {}
+    with bind.connect() as conn:
+        for indice, stmt in consultas.items():
+            compilado = stmt.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+            parametros = tuple(compilado.params[nome] for nome in compilado.positiontup)
+            plano = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compilado}", parametros).fetchall()
+            detalhes = " | ".join(linha[-1] for linha in plano)
+            resultado[indice] = (indice in detalhes, detalhes)
+    return resultado
+
+
+if __name__ == "__main__":
+    init_db()
+    for indice, (usado, plano) in verificar_indices().items():
+        print(f"{'✅' if usado else '❌'} {indice}: {plano}")
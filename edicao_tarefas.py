@@ -1,42 +1,12 @@
 from datetime import date, datetime, timedelta
 import streamlit as st
-from modelos import Usuario, RegistroDePontuacao, MetaMensalRegistro, Tarefa
-from helpers import usuarios_visiveis
-
-
-# 🔒 Lista fixa de tarefas - 
-TABELA_TAREFAS_FIXA = [
-
-        ("01", "Plantão Fiscal ½ Período", 15.00),
-        ("02", "Diligência Externa", 4.00),
-        ("02.1", "Diligência Externa fora do perímetro urbano", 6.00),
-        ("03", "Termo de Início de Ação Fiscal", 3.00),
-        ("04", "Análise de Documentos Fiscais (por lote de 50)", 4.00),
-        ("05", "Demonstrativo de Apuração de Débito Fiscal (por folha)", 4.00),
-        ("06", "Notificação", 3.00),
-        ("07", "Termo de Ocorrências", 4.00),
-        ("08", "Termo de Diligências", 2.00),
-        ("09", "Lançamento de ISSQN no Movimento Econômico (por exercício)", 2.00),
-        ("10", "Informação/Manifestação em Processo", 5.00),
-        ("11", "Elaboração de Relatórios", 5.00),
-        ("12", "Publicação de Edital", 4.00),
-        ("13", "Outras Atividades não Previstas (por unidade de 1 hora)", 4.00),
-        ("14", "Participação em Cursos ou Programas de Treinamento (por ½ período)", 15.00),
-        ("15", "Apuração Fiscal c/ resultado para um exercício", 52.00),
-        ("15.1", "Apuração Fiscal c/ resultado para exercícios adicionais", 24.00),
-        ("16", "Apuração Fiscal s/ resultado para um exercício", 30.00),
-        ("16.1", "Apuração Fiscal s/ resultado para exercícios adicionais", 8.00),
-        ("17", "Notificação para constituição de crédito tributário (sem A.Infração)", 8.00),
-        ("18", "Enquadramento do ISSQN", 8.00),
-        ("19", "Atividades Internas (por unidade de 1h)", 4.00),
-        ("20", "Auto de Infração", 6.00),
-        ("21", "Manifestação em processo de impugnação de Auto de Infração", 8.00),
-        ("21.1", "Quando o manifestante não for o autor do Auto de Infração", 12.00),
-        ("22", "Chefia ou direção de órgão responsável por atividades previstas nesta tabela (ponto por dia)", 30.00),
-        ("98", "Licenciado", 0),
-        ("99", "Licenciado", 600)
-
-    ]
+from modelos import Usuario, RegistroDePontuacao, Tarefa
+from helpers import usuarios_visiveis, registros_com_vinculo
+from catalogo_tarefas import obter_catalogo
+from saldos_mensais import atualizar_saldos_mensais, chaves_do_registro
+from cache_pdf import invalidar_pdfs
+from metricas import invalidar_projecao_expiracao
+
 
 def pagina_edicao_tarefas(session):
     st.title("Gerenciar Tarefas Registradas")
@@ -100,12 +70,15 @@ def pagina_edicao_tarefas(session):
         .all()
     )
 
+    tarefas = obter_catalogo().por_id
+    # Registros já ligados a metas não podem ser editados nem excluídos
+    vinculados = registros_com_vinculo(session, [r.id for r in registros_validos])
     registros_editaveis = []
     for r in registros_validos:
-        tarefa = r.tarefa
+        tarefa = tarefas.get(r.tarefa_id)
         if not tarefa:
             continue
-        if session.query(MetaMensalRegistro).filter_by(registro_id=r.id).first():
+        if r.id in vinculados:
             continue
 
         # Aplica filtro textual
@@ -125,10 +98,11 @@ def pagina_edicao_tarefas(session):
 
     # 📋 Lista de registros editáveis
     for r in registros_editaveis:
-        tarefa = r.tarefa
+        tarefa = tarefas[r.tarefa_id]
         with st.expander(f"{r.data_execucao.strftime('%d/%m/%Y')} - {tarefa.descricao}"):
             st.write(f"**Código:** {tarefa.codigo}")
-            st.write(f"**Pontos:** {r.pontos}")
+            st.write(f"**Pontos:** {r.pontos * (r.quantidade or 1)}")
+            st.write(f"**Quantidade:** {r.quantidade or 1}")
             st.write(f"**Expira em:** {r.data_expiracao.strftime('%d/%m/%Y')}")
             st.write(f"**Processo:** {r.numero_processo or '—'}")
 
@@ -137,15 +111,25 @@ def pagina_edicao_tarefas(session):
 
             col1, col2 = st.columns(2)
             if col1.button("💾 Salvar alterações", key=f"salvar_{r.id}"):
+                chaves = chaves_do_registro(r)
                 r.data_execucao = nova_data
                 r.numero_processo = novo_processo
+                chaves |= chaves_do_registro(r)
+                atualizar_saldos_mensais(session, chaves)
                 session.commit()
+                invalidar_pdfs(r.usuario_id, a_partir_de=min(mes for _, mes in chaves))
+                invalidar_projecao_expiracao()
                 st.success("✅ Registro atualizado com sucesso.")
                 st.rerun()
 
             if col2.button("🗑️ Excluir registro", key=f"excluir_{r.id}"):
+                chaves = chaves_do_registro(r)
+                usuario_id = r.usuario_id
                 session.delete(r)
+                atualizar_saldos_mensais(session, chaves)
                 session.commit()
+                invalidar_pdfs(usuario_id, a_partir_de=min(mes for _, mes in chaves))
+                invalidar_projecao_expiracao()
                 st.warning("🗑️ Registro excluído.")
                 st.rerun()
 
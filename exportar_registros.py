@@ -0,0 +1,263 @@
+# exportar_registros.py
+
+"""
+Exportação dos registros de pontuação para arquivos colunares (Parquet ou
+Feather), para análises fora do banco em uso pelos fiscais.
+
+Cada registro sai junto com a tarefa, o usuário (setor e equipe) e as
+unidades já consumidas por metas confirmadas. A leitura é feita em lotes
+de tamanho fixo (yield_per), em uma única transação de leitura, e cada
+lote é gravado na partição do mês de execução:
+
+    exportacao/
+        mes=2025-07/snapshot-0001.parquet
+        mes=2025-08/snapshot-0001.parquet
+        mes=2025-08/snapshot-0002.parquet
+        _snapshot.json
+
+O _snapshot.json guarda o maior id já exportado. Uma nova execução grava
+apenas os registros com id maior que esse, em novos arquivos, sem reescrever
+os anteriores. Registros editados depois de exportados e mudanças de
+consumo em metas não são reenviados; para isso use --completo, que
+reescreve a exportação inteira.
+
+Uso:
+    python exportar_registros.py [destino] [--completo] [--feather]
+
+Leitura (pyarrow):
+    pyarrow.dataset.dataset("exportacao", format="parquet", partitioning="hive")
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from db import SessionLocal
+from modelos import Usuario, Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro
+
+DIRETORIO_EXPORTACAO = os.getenv(
+    "PRODUTIVIDADE_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "exportacao")
+)
+TAMANHO_LOTE = 10000
+ARQUIVO_ESTADO = "_snapshot.json"
+EXTENSOES = {"parquet": "parquet", "feather": "feather"}
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("A exportação colunar requer o pacote pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def _esquema(pa):
+    # Esquema fixo: arquivos de snapshots diferentes sempre têm os mesmos tipos
+    return pa.schema([
+        ("registro_id", pa.int64()),
+        ("usuario_id", pa.int64()),
+        ("usuario", pa.string()),
+        ("matricula", pa.string()),
+        ("setor_id", pa.int64()),
+        ("equipe_id", pa.int64()),
+        ("tarefa_id", pa.int64()),
+        ("codigo", pa.string()),
+        ("tarefa", pa.string()),
+        ("data_execucao", pa.date32()),
+        ("data_expiracao", pa.date32()),
+        ("pontos", pa.float64()),
+        ("quantidade", pa.int64()),
+        ("unidades_utilizadas", pa.int64()),
+        ("numero_processo", pa.string()),
+    ])
+
+
+def _consulta(ultimo_id, maximo_id):
+    """SELECT dos registros no intervalo de ids, com tarefa, usuário e consumo."""
+    uso = (
+        select(
+            MetaMensalRegistro.registro_id,
+            func.sum(func.coalesce(MetaMensalRegistro.quantidade_utilizada, 1)).label("unidades")
+        )
+        .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
+        .where(
+            MetaMensal.status == "confirmado",
+            MetaMensalRegistro.registro_id > ultimo_id,
+            MetaMensalRegistro.registro_id <= maximo_id
+        )
+        .group_by(MetaMensalRegistro.registro_id)
+        .subquery()
+    )
+    return (
+        select(
+            RegistroDePontuacao.id,
+            RegistroDePontuacao.usuario_id,
+            Usuario.nome,
+            Usuario.matricula,
+            Usuario.setor_id,
+            Usuario.equipe_id,
+            RegistroDePontuacao.tarefa_id,
+            Tarefa.codigo,
+            Tarefa.descricao,
+            RegistroDePontuacao.data_execucao,
+            RegistroDePontuacao.data_expiracao,
+            RegistroDePontuacao.pontos,
+            func.coalesce(RegistroDePontuacao.quantidade, 1),
+            func.coalesce(uso.c.unidades, 0),
+            RegistroDePontuacao.numero_processo,
+        )
+        .join(Usuario, Usuario.id == RegistroDePontuacao.usuario_id)
+        .join(Tarefa, Tarefa.id == RegistroDePontuacao.tarefa_id)
+        .outerjoin(uso, uso.c.registro_id == RegistroDePontuacao.id)
+        .where(RegistroDePontuacao.id > ultimo_id, RegistroDePontuacao.id <= maximo_id)
+        .order_by(RegistroDePontuacao.id)
+        .execution_options(yield_per=TAMANHO_LOTE)
+    )
+
+
+def ler_estado(destino=DIRETORIO_EXPORTACAO):
+    """Estado da exportação: maior id exportado e histórico de snapshots."""
+    try:
+        with open(os.path.join(destino, ARQUIVO_ESTADO), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {"ultimo_id": 0, "snapshots": []}
+
+
+def _gravar_estado(destino, estado):
+    # Escrita atômica: uma exportação interrompida não deixa o estado pela metade
+    fd, temporario = tempfile.mkstemp(dir=destino, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+        json.dump(estado, arquivo, indent=2, ensure_ascii=False)
+    os.replace(temporario, os.path.join(destino, ARQUIVO_ESTADO))
+
+
+def _limpar(destino):
+    """Remove só as partições e o estado; outros arquivos do destino ficam."""
+    for nome in os.listdir(destino):
+        caminho = os.path.join(destino, nome)
+        if nome.startswith("mes=") and os.path.isdir(caminho):
+            shutil.rmtree(caminho)
+    try:
+        os.remove(os.path.join(destino, ARQUIVO_ESTADO))
+    except OSError:
+        pass
+
+
+class _Escritores:
+    """Um arquivo aberto por partição de mês, alimentado lote a lote."""
+
+    def __init__(self, pa, destino, nome, formato, esquema):
+        self.pa, self.destino, self.nome, self.formato, self.esquema = pa, destino, nome, formato, esquema
+        self.abertos = {}
+
+    def escrever(self, mes, tabela):
+        escritor = self.abertos.get(mes)
+        if escritor is None:
+            pasta = os.path.join(self.destino, f"mes={mes}")
+            os.makedirs(pasta, exist_ok=True)
+            caminho = os.path.join(pasta, f"{self.nome}.{EXTENSOES[self.formato]}")
+            if self.formato == "parquet":
+                escritor = self.pa.parquet.ParquetWriter(caminho, self.esquema, compression="zstd")
+            else:
+                # Feather v2 é o formato de arquivo IPC do Arrow
+                escritor = self.pa.ipc.new_file(
+                    caminho, self.esquema, options=self.pa.ipc.IpcWriteOptions(compression="zstd")
+                )
+            self.abertos[mes] = escritor
+        escritor.write_table(tabela)
+
+    def fechar(self):
+        for escritor in self.abertos.values():
+            escritor.close()
+        self.abertos.clear()
+
+
+def exportar_registros(session=None, destino=DIRETORIO_EXPORTACAO, formato="parquet", completo=False):
+    """
+    Exporta os registros novos (ou todos, com completo=True) para o destino.
+
+    Retorno:
+        - dict com snapshot, linhas exportadas, meses tocados e ultimo_id
+    """
+    if formato not in EXTENSOES:
+        raise ValueError(f"Formato inválido: {formato}")
+    pa = _pyarrow()
+    esquema = _esquema(pa)
+
+    os.makedirs(destino, exist_ok=True)
+    if completo:
+        _limpar(destino)
+
+    estado = ler_estado(destino)
+    if estado.get("formato", formato) != formato:
+        raise ValueError(f"O destino já contém uma exportação em {estado['formato']}; use --completo para trocar.")
+
+    propria_sessao = session is None
+    if propria_sessao:
+        session = SessionLocal()
+
+    numero = len(estado["snapshots"]) + 1
+    escritores = _Escritores(pa, destino, f"snapshot-{numero:04d}", formato, esquema)
+    linhas, meses = 0, set()
+    try:
+        # Limite superior fixo: registros gravados durante a exportação ficam para a próxima
+        maximo_id = session.execute(select(func.max(RegistroDePontuacao.id))).scalar() or 0
+        resultado = session.execute(_consulta(estado["ultimo_id"], maximo_id))
+
+        for lote in resultado.partitions():
+            colunas = list(zip(*lote))
+            tabela = pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+                schema=esquema
+            )
+            # Particiona o lote pelo mês de execução
+            meses_lote = pa.compute.strftime(tabela["data_execucao"], format="%Y-%m")
+            for mes in pa.compute.unique(meses_lote).to_pylist():
+                escritores.escrever(mes, tabela.filter(pa.compute.equal(meses_lote, mes)))
+                meses.add(mes)
+            linhas += len(lote)
+    finally:
+        escritores.fechar()
+        if propria_sessao:
+            session.close()
+
+    if linhas:
+        estado["ultimo_id"] = maximo_id
+        estado["formato"] = formato
+        estado["snapshots"].append({
+            "numero": numero,
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "linhas": linhas,
+            "ultimo_id": maximo_id,
+            "meses": sorted(meses),
+        })
+        _gravar_estado(destino, estado)
+
+    return {"snapshot": numero if linhas else None, "linhas": linhas, "meses": sorted(meses),
+            "ultimo_id": estado["ultimo_id"]}
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    destino = argumentos[0] if argumentos else DIRETORIO_EXPORTACAO
+    formato = "feather" if "--feather" in sys.argv[1:] else "parquet"
+
+    try:
+        resumo = exportar_registros(destino=destino, formato=formato, completo="--completo" in sys.argv[1:])
+    except ValueError as erro:
+        print(f"❌ {erro}")
+        sys.exit(1)
+
+    if resumo["linhas"]:
+        print(f"📦 Snapshot {resumo['snapshot']}: {resumo['linhas']} registros em "
+              f"{len(resumo['meses'])} mês(es) ({destino}).")
+    else:
+        print(f"✔️ Nenhum registro novo desde o último snapshot (id {resumo['ultimo_id']}).")
@@ -1,6 +1,7 @@
 import streamlit as st
 from modelos import Equipe, Usuario
 from auth import exigir_login
+from helpers import invalidar_usuarios_visiveis
 
 
 def pagina_gerenciar_equipes(session):
@@ -27,6 +28,7 @@ def pagina_gerenciar_equipes(session):
                 nova = Equipe(nome=nome_limpo)
                 session.add(nova)
                 session.commit()
+                invalidar_usuarios_visiveis()
                 st.success("Equipe cadastrada com sucesso!")
 
                 # Marca para limpar o campo na próxima execução
@@ -56,6 +58,7 @@ def pagina_gerenciar_equipes(session):
                     else:
                         session.delete(equipe)
                         session.commit()
+                        invalidar_usuarios_visiveis()
                         st.success("Equipe excluída com sucesso!")
                         st.rerun()
 
@@ -82,6 +85,7 @@ def pagina_gerenciar_equipes(session):
                         else:
                             equipe.nome = nome_editado
                             session.commit()
+                            invalidar_usuarios_visiveis()
                             st.success("Nome da equipe atualizado!")
                             st.session_state[f"editando_{equipe.id}"] = False
                             st.rerun()
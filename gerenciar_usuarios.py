@@ -3,6 +3,7 @@ import bcrypt
 import time
 from auth import exigir_login
 from modelos import Usuario, Setor, Equipe
+from helpers import invalidar_usuarios_visiveis
 
 def pagina_gerenciar_usuarios(session):
     st.title("🔧 Gerenciar Usuários")
@@ -137,6 +138,7 @@ def pagina_gerenciar_usuarios(session):
                             usuario.primeiro_acesso = True
 
                         session.commit()
+                        invalidar_usuarios_visiveis()
                         session.refresh(usuario)
 
                         st.success("✅ Alterações salvas com sucesso!")
@@ -1,24 +1,174 @@
 # helpers.py - 
-from modelos import Usuario
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select, func, and_, or_, true, false
+from sqlalchemy.orm import aliased
+from modelos import Usuario, RegistroDePontuacao, MetaMensal, MetaMensalRegistro
+
+
+@dataclass(frozen=True)
+class UsuarioVisivel:
+    """Cópia imutável dos dados de um usuário usados nos seletores das páginas."""
+    id: int
+    nome: str
+    login: str
+    papel: str
+    setor_id: Optional[int]
+    equipe_id: Optional[int]
+    lider_id: Optional[int]
+
+
+_trava_visiveis = threading.Lock()
+_cache_visiveis = {}
+_geracao_visiveis = 0
+
+
+def invalidar_usuarios_visiveis():
+    """Descarta o cache de visibilidade (chamar após criar/alterar usuários ou equipes)."""
+    global _geracao_visiveis
+    with _trava_visiveis:
+        _geracao_visiveis += 1
+        _cache_visiveis.clear()
+
+
+def _consultar_visiveis(session, papel, setor_id, equipe_id, usuario_id):
+    """
+    Resolve em uma única consulta (CTE recursiva) o escopo do papel
+    somado a todos os liderados diretos e indiretos via lider_id.
+    """
+    subordinado = aliased(Usuario)
+    liderados = (
+        select(Usuario.id)
+        .where(Usuario.lider_id == usuario_id)
+        .cte("liderados", recursive=True)
+    )
+    liderados = liderados.union(
+        select(subordinado.id).join(liderados, subordinado.lider_id == liderados.c.id)
+    )
 
-def usuarios_visiveis(usuario_logado, session):
-    papel = usuario_logado.papel.lower()
-    visiveis = []
     if papel == "admin":
-        visiveis = session.query(Usuario).filter(Usuario.login != "admin").all()
+        escopo = true()
     elif papel == "gestor":
-        visiveis = session.query(Usuario).filter(
-            Usuario.setor_id == usuario_logado.setor_id,
-            Usuario.login != "admin"
-        ).all()
+        escopo = Usuario.setor_id == setor_id
     elif papel in ("lider", "chefe"):
-        visiveis = session.query(Usuario).filter(
-            Usuario.equipe_id == usuario_logado.equipe_id,
-            Usuario.login != "admin"
-        ).all()
-    elif papel == "fiscal":
-        visiveis = [usuario_logado]
-    if usuario_logado not in visiveis:
-        visiveis.append(usuario_logado)
-    return visiveis
+        escopo = Usuario.equipe_id == equipe_id
+    else:
+        escopo = false()
+
+    linhas = session.execute(
+        select(
+            Usuario.id, Usuario.nome, Usuario.login, Usuario.papel,
+            Usuario.setor_id, Usuario.equipe_id, Usuario.lider_id
+        )
+        .where(or_(
+            Usuario.id == usuario_id,
+            and_(
+                Usuario.login != "admin",
+                or_(escopo, Usuario.id.in_(select(liderados.c.id)))
+            )
+        ))
+        .order_by(Usuario.id)
+    ).all()
+    return tuple(UsuarioVisivel(*linha) for linha in linhas)
+
+
+def usuarios_visiveis(usuario_logado, session):
+    """
+    Usuários que o usuário logado pode consultar: o escopo do papel
+    (admin: todos, gestor: setor, chefe/lider: equipe), seus liderados
+    diretos e indiretos e ele mesmo. O resultado fica em cache por
+    (papel, setor_id, equipe_id, usuario).
+    """
+    papel = usuario_logado.papel.lower()
+    chave = (papel, usuario_logado.setor_id, usuario_logado.equipe_id, usuario_logado.id)
+
+    visiveis = _cache_visiveis.get(chave)
+    if visiveis is None:
+        geracao = _geracao_visiveis
+        visiveis = _consultar_visiveis(session, *chave)
+        with _trava_visiveis:
+            # Não guarda um resultado calculado antes de uma invalidação
+            if geracao == _geracao_visiveis:
+                _cache_visiveis[chave] = visiveis
+    return list(visiveis)
+
+
+def unidades_utilizadas(*filtros):
+    """
+    Subconsulta escalar correlacionada com RegistroDePontuacao: quantas
+    unidades do registro já foram consumidas em metas confirmadas.
+    Filtros extras (ex.: MetaMensal.ano_mes == periodo) restringem as metas.
+    """
+    return (
+        select(func.coalesce(func.sum(func.coalesce(MetaMensalRegistro.quantidade_utilizada, 1)), 0))
+        .select_from(MetaMensalRegistro)
+        .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
+        .where(
+            MetaMensalRegistro.registro_id == RegistroDePontuacao.id,
+            MetaMensal.status == "confirmado",
+            *filtros
+        )
+        .scalar_subquery()
+    )
+
+
+def unidades_disponiveis():
+    """Expressão SQL com as unidades de um registro ainda não utilizadas."""
+    return func.coalesce(RegistroDePontuacao.quantidade, 1) - unidades_utilizadas()
+
+
+def quantidades_utilizadas(session, registro_ids, somente_confirmados=True):
+    """
+    Retorna {registro_id: (quantidade do registro, unidades já utilizadas)}
+    para os registros que têm algum vínculo com meta.
+
+    Faz uma única consulta (em lotes, por causa do limite de parâmetros do
+    SQLite) em vez de um SELECT por registro.
+    """
+    ids = list({rid for rid in registro_ids if rid is not None})
+    consumo = {}
+    for i in range(0, len(ids), 900):
+        lote = ids[i:i + 900]
+        query = (
+            session.query(
+                MetaMensalRegistro.registro_id,
+                func.coalesce(RegistroDePontuacao.quantidade, 1),
+                func.sum(func.coalesce(MetaMensalRegistro.quantidade_utilizada, 1))
+            )
+            .join(RegistroDePontuacao, MetaMensalRegistro.registro_id == RegistroDePontuacao.id)
+            .filter(MetaMensalRegistro.registro_id.in_(lote))
+            .group_by(MetaMensalRegistro.registro_id, RegistroDePontuacao.quantidade)
+        )
+        if somente_confirmados:
+            query = query.join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id).filter(
+                MetaMensal.status == "confirmado"
+            )
+        consumo.update({rid: (quantidade, usado) for rid, quantidade, usado in query})
+    return consumo
+
+
+def registros_com_vinculo(session, registro_ids):
+    """
+    Retorna o conjunto de IDs de registros ligados a alguma meta (qualquer
+    status), em uma consulta por lote de 900 IDs em vez de uma por registro.
+    """
+    ids = list({rid for rid in registro_ids if rid is not None})
+    vinculados = set()
+    for i in range(0, len(ids), 900):
+        vinculados.update(session.scalars(
+            select(MetaMensalRegistro.registro_id)
+            .where(MetaMensalRegistro.registro_id.in_(ids[i:i + 900]))
+            .distinct()
+        ))
+    return vinculados
+
 
+def registros_utilizados(session, registro_ids, somente_confirmados=True):
+    """Retorna o conjunto de IDs de registros cujas unidades já foram todas utilizadas."""
+    return {
+        rid
+        for rid, (quantidade, usado) in quantidades_utilizadas(session, registro_ids, somente_confirmados).items()
+        if usado >= quantidade
+    }
@@ -0,0 +1,328 @@
+# importar_registros.py
+
+"""
+Importação em lote de registros de produtividade a partir de planilhas
+CSV ou XLSX.
+
+Colunas reconhecidas (cabeçalho na primeira linha):
+    codigo           código da tarefa (obrigatório)
+    data_execucao    dd/mm/aaaa ou aaaa-mm-dd (obrigatório)
+    numero_processo  número do processo (obrigatório)
+    quantidade       unidades realizadas (padrão 1)
+    usuario          login do usuário (padrão: usuário informado na chamada)
+
+O arquivo é lido em lotes. As tarefas são resolvidas pelo catálogo em
+memória e as duplicidades (usuário, tarefa, processo) são conferidas contra
+um conjunto montado com uma única consulta. As linhas válidas entram em uma
+só transação, junto com a atualização do saldo mensal; as rejeitadas voltam
+no resultado com o número da linha e o motivo.
+
+Uso:
+    python importar_registros.py arquivo.csv [login_padrao]
+"""
+
+import csv
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import insert, select
+
+from db import SessionLocal
+from modelos import Usuario, RegistroDePontuacao
+from catalogo_tarefas import obter_catalogo
+from saldos_mensais import atualizar_saldos_mensais, mes_de
+from metricas import invalidar_projecao_expiracao
+from cadastrar_produtividade import REGISTRO_COMPACTO
+
+
+TAMANHO_LOTE = 5000
+
+# Nomes alternativos aceitos no cabeçalho
+APELIDOS_COLUNAS = {
+    "tarefa": "codigo",
+    "codigo_tarefa": "codigo",
+    "data": "data_execucao",
+    "processo": "numero_processo",
+    "qtd": "quantidade",
+    "login": "usuario",
+}
+COLUNAS_OBRIGATORIAS = ("codigo", "data_execucao", "numero_processo")
+
+
+@dataclass
+class ResultadoImportacao:
+    linhas_lidas: int = 0
+    registros_inseridos: int = 0
+    unidades_inseridas: int = 0
+    rejeitados: list = field(default_factory=list)  # (linha, motivo, dados)
+
+    def rejeitados_df(self):
+        return pd.DataFrame(
+            [{"Linha": linha, "Motivo": motivo, **dados} for linha, motivo, dados in self.rejeitados]
+        )
+
+
+# -------------------------------
+# 📄 Leitura da planilha
+# -------------------------------
+def _normalizar_coluna(nome):
+    nome = str(nome or "").strip().lower().replace(" ", "_")
+    return APELIDOS_COLUNAS.get(nome, nome)
+
+
+def _ler_csv(origem, tamanho_lote):
+    # sep=None detecta ';' ou ',' (planilhas exportadas em pt-BR usam ';')
+    leitor = pd.read_csv(
+        origem, dtype=str, keep_default_na=False, sep=None, engine="python",
+        encoding="utf-8-sig", chunksize=tamanho_lote
+    )
+    inicio = 2  # linha 1 é o cabeçalho
+    for df in leitor:
+        df.columns = [_normalizar_coluna(c) for c in df.columns]
+        yield inicio, df.to_dict("records")
+        inicio += len(df)
+
+
+def _ler_xlsx(origem, tamanho_lote):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Leitura de XLSX requer o pacote openpyxl (pip install openpyxl).")
+
+    planilha = load_workbook(origem, read_only=True, data_only=True).active
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = [_normalizar_coluna(c) for c in next(linhas, ())]
+
+    inicio, lote = 2, []
+    for valores in linhas:
+        lote.append(dict(zip(cabecalho, valores)))
+        if len(lote) >= tamanho_lote:
+            yield inicio, lote
+            inicio, lote = inicio + len(lote), []
+    if lote:
+        yield inicio, lote
+
+
+def ler_planilha(origem, nome=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera lotes (número da primeira linha, lista de dicts) a partir de um
+    caminho ou de um arquivo aberto (ex.: UploadedFile do Streamlit).
+    """
+    nome = nome or getattr(origem, "name", None) or str(origem)
+    extensao = os.path.splitext(nome)[1].lower()
+    if extensao in (".xlsx", ".xlsm"):
+        return _ler_xlsx(origem, tamanho_lote)
+    if extensao in (".csv", ".txt"):
+        return _ler_csv(origem, tamanho_lote)
+    raise ValueError(f"Formato não suportado: {extensao or nome}")
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _converter_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _texto(valor)
+    for formato in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+# -------------------------------
+# 📥 Importação
+# -------------------------------
+def importar_registros(session, origem, nome=None, usuario_padrao_id=None, usuarios_permitidos=None,
+                       tamanho_lote=TAMANHO_LOTE, compacto=REGISTRO_COMPACTO):
+    """
+    Importa a planilha e faz commit das linhas válidas de uma só vez.
+
+    Parâmetros:
+        - usuario_padrao_id: dono das linhas sem a coluna 'usuario'
+        - usuarios_permitidos: ids que podem receber registros (None = todos)
+
+    Retorno:
+        - ResultadoImportacao
+    """
+    resultado = ResultadoImportacao()
+    catalogo = obter_catalogo()
+
+    consulta_usuarios = select(Usuario.login, Usuario.id)
+    if usuarios_permitidos is not None:
+        consulta_usuarios = consulta_usuarios.where(Usuario.id.in_(usuarios_permitidos))
+    ids_por_login = {login: uid for login, uid in session.execute(consulta_usuarios)}
+    ids_validos = set(ids_por_login.values())
+
+    # 🔍 Chaves já gravadas (usuário, tarefa, processo) em uma única consulta
+    consulta_existentes = select(
+        RegistroDePontuacao.usuario_id, RegistroDePontuacao.tarefa_id, RegistroDePontuacao.numero_processo
+    ).distinct()
+    if usuarios_permitidos is not None:
+        consulta_existentes = consulta_existentes.where(RegistroDePontuacao.usuario_id.in_(ids_validos))
+    existentes = set(session.execute(consulta_existentes).all())
+
+    chaves_saldo = set()
+    try:
+        for primeira_linha, linhas in ler_planilha(origem, nome, tamanho_lote):
+            novos = []
+            for numero, dados in enumerate(linhas, start=primeira_linha):
+                if not any(_texto(v) for v in dados.values()):
+                    continue  # linha em branco
+                resultado.linhas_lidas += 1
+
+                def rejeitar(motivo):
+                    resultado.rejeitados.append((numero, motivo, {k: _texto(v) for k, v in dados.items()}))
+
+                faltando = [c for c in COLUNAS_OBRIGATORIAS if not _texto(dados.get(c))]
+                if faltando:
+                    rejeitar(f"Campo obrigatório vazio: {', '.join(faltando)}")
+                    continue
+
+                login = _texto(dados.get("usuario"))
+                usuario_id = ids_por_login.get(login) if login else usuario_padrao_id
+                if usuario_id is None or usuario_id not in ids_validos:
+                    rejeitar(f"Usuário inválido ou sem permissão: {login or '(não informado)'}")
+                    continue
+
+                tarefa = catalogo.por_codigo.get(_texto(dados["codigo"]))
+                if tarefa is None or not tarefa.ativa:
+                    rejeitar(f"Tarefa inexistente ou inativa: {_texto(dados['codigo'])}")
+                    continue
+
+                data_execucao = _converter_data(dados["data_execucao"])
+                if data_execucao is None:
+                    rejeitar(f"Data inválida: {_texto(dados['data_execucao'])}")
+                    continue
+
+                try:
+                    quantidade = int(float(_texto(dados.get("quantidade")) or 1))
+                except ValueError:
+                    quantidade = 0
+                if quantidade < 1:
+                    rejeitar(f"Quantidade inválida: {_texto(dados.get('quantidade'))}")
+                    continue
+
+                numero_processo = _texto(dados["numero_processo"])
+                chave = (usuario_id, tarefa.id, numero_processo)
+                if chave in existentes:
+                    rejeitar("Registro duplicado (usuário, tarefa e processo já cadastrados)")
+                    continue
+                existentes.add(chave)
+
+                data_expiracao = data_execucao + timedelta(days=365)
+                for qtd in ([quantidade] if compacto else [1] * quantidade):
+                    novos.append({
+                        "usuario_id": usuario_id,
+                        "tarefa_id": tarefa.id,
+                        "data_execucao": data_execucao,
+                        "quantidade": qtd,
+                        "pontos": tarefa.pontos,  # pontos por unidade
+                        "data_expiracao": data_expiracao,
+                        "numero_processo": numero_processo,
+                        "usado_para_meta": False,
+                    })
+                resultado.unidades_inseridas += quantidade
+                chaves_saldo.add((usuario_id, mes_de(data_execucao)))
+                chaves_saldo.add((usuario_id, mes_de(data_expiracao)))
+
+            if novos:
+                session.execute(insert(RegistroDePontuacao), novos)
+                resultado.registros_inseridos += len(novos)
+
+        # 📒 Saldo mensal na mesma transação dos registros
+        atualizar_saldos_mensais(session, chaves_saldo)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if resultado.registros_inseridos:
+        invalidar_projecao_expiracao()
+    return resultado
+
+
+# -------------------------------
+# 🖥️ Interface (Cadastrar Produtividade)
+# -------------------------------
+def secao_importar_planilha(session, nomes_usuarios, usuario_padrao_id):
+    """Upload de planilha para os usuários visíveis ao usuário logado."""
+    import streamlit as st
+
+    st.caption(
+        "Colunas: codigo, data_execucao, numero_processo, quantidade (opcional) "
+        "e usuario (login, opcional; sem ela as linhas vão para o usuário selecionado acima)."
+    )
+    arquivo = st.file_uploader("Planilha CSV ou XLSX", type=["csv", "xlsx"], key="importar_planilha")
+    if arquivo is None or not st.button("📥 Importar", key="importar_registros"):
+        return
+
+    try:
+        resultado = importar_registros(
+            session, arquivo, arquivo.name,
+            usuario_padrao_id=usuario_padrao_id,
+            usuarios_permitidos=set(nomes_usuarios)
+        )
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+    except Exception as e:
+        st.error("❌ Erro ao importar a planilha. Nenhum registro foi salvo.")
+        st.exception(e)
+        return
+
+    st.success(
+        f"✅ {resultado.unidades_inseridas} unidade(s) importada(s) em "
+        f"{resultado.registros_inseridos} registro(s), de {resultado.linhas_lidas} linha(s) lida(s)."
+    )
+    if resultado.rejeitados:
+        st.warning(f"⚠️ {len(resultado.rejeitados)} linha(s) rejeitada(s):")
+        df = resultado.rejeitados_df()
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.download_button(
+            "⬇️ Baixar linhas rejeitadas",
+            df.to_csv(index=False, sep=";").encode("utf-8-sig"),
+            file_name="linhas_rejeitadas.csv",
+            mime="text/csv"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python importar_registros.py arquivo.csv|arquivo.xlsx [login_padrao]")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        usuario_padrao_id = None
+        if len(sys.argv) > 2:
+            usuario = session.query(Usuario).filter_by(login=sys.argv[2]).first()
+            if usuario is None:
+                print(f"❌ Usuário não encontrado: {sys.argv[2]}")
+                sys.exit(1)
+            usuario_padrao_id = usuario.id
+
+        resultado = importar_registros(session, sys.argv[1], usuario_padrao_id=usuario_padrao_id)
+    finally:
+        session.close()
+
+    print(f"📄 {resultado.linhas_lidas} linhas lidas.")
+    print(f"✅ {resultado.registros_inseridos} registros inseridos ({resultado.unidades_inseridas} unidades).")
+    print(f"🚫 {len(resultado.rejeitados)} linhas rejeitadas.")
+    if resultado.rejeitados:
+        escritor = csv.writer(sys.stdout, delimiter=";")
+        escritor.writerow(["linha", "motivo"])
+        for linha, motivo, _ in resultado.rejeitados:
+            escritor.writerow([linha, motivo])
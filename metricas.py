@@ -0,0 +1,229 @@
+# metricas.py
+"""
+Métricas mensais de pontuação calculadas direto no banco.
+Não depende do Streamlit: pode ser chamado por scripts, cache ou benchmarks.
+"""
+
+import threading
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, case, and_
+from modelos import Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro, SaldoMensal
+from helpers import unidades_utilizadas, unidades_disponiveis
+
+
+def intervalo_do_periodo(periodo):
+    """Converte 'YYYY-MM' em (primeiro dia do mês, primeiro dia do mês seguinte)."""
+    inicio_mes = datetime.strptime(periodo, "%Y-%m").date()
+    return inicio_mes, inicio_mes + relativedelta(months=1)
+
+
+def calcular_metricas_mes(session, usuario_id, periodo):
+    """
+    Calcula em um único SELECT agrupado as métricas do cabeçalho da
+    Consulta de Pontuação para um usuário e um período 'YYYY-MM'.
+
+    Retorno:
+        - dict com realizado, utilizado_mes, utilizado_antigo, expirando,
+          qtd_expirando (unidades), saldo_mensal e total_utilizado
+    """
+    inicio_mes, fim_mes = intervalo_do_periodo(periodo)
+
+    # Unidades consumidas em metas confirmadas do próprio usuário no período
+    usado_no_periodo = unidades_utilizadas(
+        MetaMensal.usuario_id == usuario_id,
+        MetaMensal.ano_mes == periodo
+    )
+    # Unidades ainda livres (registros compactos podem ter uso parcial)
+    disponivel = unidades_disponiveis()
+    quantidade = func.coalesce(RegistroDePontuacao.quantidade, 1)
+
+    do_mes = RegistroDePontuacao.data_execucao >= inicio_mes
+    expira_no_mes = and_(
+        RegistroDePontuacao.data_expiracao >= inicio_mes,
+        RegistroDePontuacao.data_expiracao < fim_mes,
+        disponivel > 0
+    )
+
+    linha = (
+        session.query(
+            func.sum(case((and_(do_mes, Tarefa.ativa == True), Tarefa.pontos * quantidade), else_=0)),
+            func.sum(case((do_mes, Tarefa.pontos * usado_no_periodo), else_=0)),
+            func.sum(case((~do_mes, Tarefa.pontos * usado_no_periodo), else_=0)),
+            func.sum(case((expira_no_mes, RegistroDePontuacao.pontos * disponivel), else_=0)),
+            func.sum(case((expira_no_mes, disponivel), else_=0))
+        )
+        .join(Tarefa, RegistroDePontuacao.tarefa_id == Tarefa.id)
+        .filter(
+            RegistroDePontuacao.usuario_id == usuario_id,
+            RegistroDePontuacao.data_execucao < fim_mes
+        )
+        .one()
+    )
+
+    realizado, utilizado_mes, utilizado_antigo, expirando, qtd_expirando = (v or 0 for v in linha)
+
+    return {
+        "realizado": realizado,
+        "utilizado_mes": utilizado_mes,
+        "utilizado_antigo": utilizado_antigo,
+        "expirando": expirando,
+        "qtd_expirando": int(qtd_expirando),
+        "saldo_mensal": realizado - utilizado_mes,
+        "total_utilizado": utilizado_mes + utilizado_antigo,
+    }
+
+
+def calcular_expirando_usuarios(session, usuario_ids, periodo):
+    """
+    Pontos ainda livres que expiram no período, para vários usuários em um
+    único SELECT agrupado (mesmo valor de 'expirando' em calcular_metricas_mes).
+
+    Retorno:
+        - dict usuario_id -> pontos
+    """
+    inicio_mes, fim_mes = intervalo_do_periodo(periodo)
+    disponivel = unidades_disponiveis()
+
+    linhas = (
+        session.query(
+            RegistroDePontuacao.usuario_id,
+            func.sum(RegistroDePontuacao.pontos * disponivel)
+        )
+        .join(Tarefa, RegistroDePontuacao.tarefa_id == Tarefa.id)
+        .filter(
+            RegistroDePontuacao.usuario_id.in_(usuario_ids),
+            RegistroDePontuacao.data_execucao < fim_mes,
+            RegistroDePontuacao.data_expiracao >= inicio_mes,
+            RegistroDePontuacao.data_expiracao < fim_mes,
+            disponivel > 0
+        )
+        .group_by(RegistroDePontuacao.usuario_id)
+        .all()
+    )
+    expirando = {uid: 0 for uid in usuario_ids}
+    expirando.update({uid: total or 0 for uid, total in linhas})
+    return expirando
+
+
+def calcular_alerta_prescricao(session, usuario_id, hoje):
+    """
+    Pontos realizados há 12 meses (mês que prescreve agora) e quanto deles já
+    foi usado em metas confirmadas. Sempre duas consultas, independente da
+    quantidade de metas e registros do usuário.
+
+    Retorno:
+        - None se não houve produção no mês, ou dict com mes, realizado,
+          utilizado e saldo (pontos que vão prescrever)
+    """
+    mes_prescricao = f"{hoje.year - 1}-{hoje.month:02d}"
+    inicio_mes, fim_mes = intervalo_do_periodo(mes_prescricao)
+
+    realizado = session.query(SaldoMensal.realizado).filter(
+        SaldoMensal.usuario_id == usuario_id,
+        SaldoMensal.ano_mes == mes_prescricao
+    ).scalar()
+    if realizado is None:
+        return None
+
+    utilizado = (
+        session.query(func.sum(Tarefa.pontos * func.coalesce(MetaMensalRegistro.quantidade_utilizada, 1)))
+        .select_from(MetaMensalRegistro)
+        .join(MetaMensal, MetaMensalRegistro.meta_id == MetaMensal.id)
+        .join(RegistroDePontuacao, MetaMensalRegistro.registro_id == RegistroDePontuacao.id)
+        .join(Tarefa, RegistroDePontuacao.tarefa_id == Tarefa.id)
+        .filter(
+            MetaMensal.usuario_id == usuario_id,
+            MetaMensal.status == "confirmado",
+            RegistroDePontuacao.usuario_id == usuario_id,
+            RegistroDePontuacao.data_execucao >= inicio_mes,
+            RegistroDePontuacao.data_execucao < fim_mes
+        )
+        .scalar()
+    ) or 0
+
+    return {
+        "mes": mes_prescricao,
+        "realizado": realizado,
+        "utilizado": utilizado,
+        "saldo": max(realizado - utilizado, 0),
+    }
+
+
+GRANULARIDADES_PROJECAO = ("semana", "mes")
+
+
+def projetar_expiracao(session, usuario_ids, hoje, meses=3, granularidade="mes", por_usuario=False):
+    """
+    Pontos ainda não utilizados que expiram entre hoje e hoje + meses,
+    somados por semana (segunda-feira, 'YYYY-MM-DD') ou por mês ('YYYY-MM')
+    de expiração, em um único SELECT agrupado.
+
+    Usa os pontos gravados no registro, então tarefas desativadas continuam
+    contando; unidades já consumidas por metas confirmadas são descontadas.
+
+    Retorno:
+        - lista de (periodo, pontos), ou (periodo, usuario_id, pontos) se por_usuario
+    """
+    if not 1 <= meses <= 12:
+        raise ValueError("O horizonte da projeção deve ser de 1 a 12 meses.")
+    if granularidade not in GRANULARIDADES_PROJECAO:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+
+    if granularidade == "semana":
+        periodo = func.date(RegistroDePontuacao.data_expiracao, "-6 days", "weekday 1")
+    else:
+        periodo = func.strftime("%Y-%m", RegistroDePontuacao.data_expiracao)
+    periodo = periodo.label("periodo")
+
+    disponivel = unidades_disponiveis()
+    agrupamento = [periodo, RegistroDePontuacao.usuario_id] if por_usuario else [periodo]
+
+    linhas = (
+        session.query(*agrupamento, func.sum(RegistroDePontuacao.pontos * disponivel))
+        .filter(
+            RegistroDePontuacao.usuario_id.in_(list(usuario_ids)),
+            RegistroDePontuacao.data_expiracao >= hoje,
+            RegistroDePontuacao.data_expiracao <= hoje + relativedelta(months=meses),
+            disponivel > 0
+        )
+        .group_by(*agrupamento)
+        .order_by(*agrupamento)
+        .all()
+    )
+    return [tuple(linha) for linha in linhas]
+
+
+# 🗃️ Cache da projeção por equipe/setor: invalidado após gravações que mudam
+# pontos disponíveis (confirmações, cadastros, edições e importações)
+_trava_projecao = threading.Lock()
+_cache_projecao = {}
+_geracao_projecao = 0
+LIMITE_CACHE_PROJECAO = 64
+
+
+def invalidar_projecao_expiracao():
+    """Descarta as projeções em cache (chamar após o commit de quem gravou)."""
+    global _geracao_projecao
+    with _trava_projecao:
+        _geracao_projecao += 1
+        _cache_projecao.clear()
+
+
+def projetar_expiracao_usuarios(session, usuario_ids, hoje, meses=3, granularidade="mes"):
+    """
+    Versão em cache de projetar_expiracao(..., por_usuario=True) para a visão
+    de equipe/setor, chaveada por (usuários, dia, horizonte, granularidade).
+    """
+    chave = (tuple(sorted(usuario_ids)), hoje, meses, granularidade)
+    linhas = _cache_projecao.get(chave)
+    if linhas is None:
+        geracao = _geracao_projecao
+        linhas = projetar_expiracao(session, usuario_ids, hoje, meses, granularidade, por_usuario=True)
+        with _trava_projecao:
+            # Não guarda um resultado calculado antes de uma invalidação
+            if geracao == _geracao_projecao:
+                if len(_cache_projecao) >= LIMITE_CACHE_PROJECAO:
+                    _cache_projecao.clear()
+                _cache_projecao[chave] = linhas
+    return list(linhas)
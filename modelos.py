@@ -1,13 +1,19 @@
 from sqlalchemy import (
     Column, Integer, String, Date, DateTime, ForeignKey,
-    Float, Boolean, Text, func
+    Float, Boolean, Text, Index, UniqueConstraint, func
 )
-from sqlalchemy.orm import declarative_base, relationship
+import os
+from sqlalchemy.orm import declarative_base, relationship, backref
 from enum import Enum
 
 # Base declarativa usada pelo Alembic - 
 Base = declarative_base()
 
+# 🧪 Modo desenvolvimento: PRODUTIVIDADE_LAZY_RAISE=1 faz toda carga preguiçosa
+# que precisaria de SQL levantar erro, denunciando consultas N+1. Quem precisa
+# de um relacionamento deve carregá-lo com selectinload/joinedload/contains_eager.
+LAZY_PADRAO = "raise_on_sql" if os.getenv("PRODUTIVIDADE_LAZY_RAISE") == "1" else "select"
+
 # ----------------------------
 # 🎯 Enum para Status da Meta
 # ----------------------------
@@ -25,7 +31,7 @@ class Setor(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome = Column(String, nullable=False)
 
-    usuarios = relationship('Usuario', back_populates='setor')
+    usuarios = relationship('Usuario', back_populates='setor', lazy=LAZY_PADRAO)
 
     def __repr__(self):
         return f"<Setor(id={self.id}, nome='{self.nome}')>"
@@ -39,7 +45,7 @@ class Equipe(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome = Column(String, unique=True, nullable=False)
 
-    usuarios = relationship("Usuario", back_populates="equipe")
+    usuarios = relationship("Usuario", back_populates="equipe", lazy=LAZY_PADRAO)
 
     def __repr__(self):
         return f"<Equipe(id={self.id}, nome='{self.nome}')>"
@@ -62,21 +68,26 @@ class Usuario(Base):
     ativo = Column(Boolean, default=True)
     primeiro_acesso = Column(Boolean, default=True)
 
-    setor = relationship('Setor', back_populates='usuarios')
-    equipe = relationship('Equipe', back_populates='usuarios')
-    registros = relationship('RegistroDePontuacao', back_populates='usuario')
+    setor = relationship('Setor', back_populates='usuarios', lazy=LAZY_PADRAO)
+    equipe = relationship('Equipe', back_populates='usuarios', lazy=LAZY_PADRAO)
+    registros = relationship('RegistroDePontuacao', back_populates='usuario', lazy=LAZY_PADRAO)
     metas = relationship(
         'MetaMensal',
         back_populates='usuario',
-        foreign_keys='MetaMensal.usuario_id'
+        foreign_keys='MetaMensal.usuario_id',
+        lazy=LAZY_PADRAO
     )
     metas_validadas = relationship(
         'MetaMensal',
         back_populates='validador',
-        foreign_keys='MetaMensal.validador_id'
+        foreign_keys='MetaMensal.validador_id',
+        lazy=LAZY_PADRAO
+    )
+    lider = relationship(
+        'Usuario', remote_side=[id], lazy=LAZY_PADRAO,
+        backref=backref('liderados', lazy=LAZY_PADRAO)
     )
-    lider = relationship('Usuario', remote_side=[id], backref='liderados')
-    tarefas = relationship('Tarefa', back_populates='usuario', cascade="all, delete-orphan")
+    tarefas = relationship('Tarefa', back_populates='usuario', cascade="all, delete-orphan", lazy=LAZY_PADRAO)
 
     def __repr__(self):
         return f"<Usuario(id={self.id}, nome='{self.nome}', login='{self.login}')>"
@@ -92,7 +103,7 @@ class Projeto(Base):
     descricao = Column(Text)
     data_criacao = Column(Date, default=func.current_date())
 
-    tarefas = relationship("Tarefa", back_populates="projeto", cascade="all, delete-orphan")
+    tarefas = relationship("Tarefa", back_populates="projeto", cascade="all, delete-orphan", lazy=LAZY_PADRAO)
 
     def __repr__(self):
         return f"<Projeto(nome={self.nome})>"
@@ -116,10 +127,10 @@ class Tarefa(Base):
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
     projeto_id = Column(Integer, ForeignKey("projetos.id"), nullable=True)
 
-    usuario = relationship("Usuario", back_populates="tarefas")
-    projeto = relationship("Projeto", back_populates="tarefas")
-    apontamentos = relationship("Apontamento", back_populates="tarefa", cascade="all, delete-orphan")
-    registros = relationship('RegistroDePontuacao', back_populates='tarefa')
+    usuario = relationship("Usuario", back_populates="tarefas", lazy=LAZY_PADRAO)
+    projeto = relationship("Projeto", back_populates="tarefas", lazy=LAZY_PADRAO)
+    apontamentos = relationship("Apontamento", back_populates="tarefa", cascade="all, delete-orphan", lazy=LAZY_PADRAO)
+    registros = relationship('RegistroDePontuacao', back_populates='tarefa', lazy=LAZY_PADRAO)
 
     def __repr__(self):
         return f"<Tarefa(titulo={self.titulo}, status={self.status})>"
@@ -135,7 +146,7 @@ class Apontamento(Base):
     data = Column(Date, default=func.current_date())
     horas = Column(Float, nullable=False)
 
-    tarefa = relationship("Tarefa", back_populates="apontamentos")
+    tarefa = relationship("Tarefa", back_populates="apontamentos", lazy=LAZY_PADRAO)
 
     def __repr__(self):
         return f"<Apontamento(tarefa_id={self.tarefa_id}, horas={self.horas})>"
@@ -156,9 +167,15 @@ class RegistroDePontuacao(Base):
     quantidade = Column(Integer, default=1)
     numero_processo = Column(String, nullable=True)
 
-    usuario = relationship('Usuario', back_populates='registros')
-    tarefa = relationship('Tarefa', back_populates='registros')
-    metas = relationship("MetaMensalRegistro", back_populates="registro")
+    usuario = relationship('Usuario', back_populates='registros', lazy=LAZY_PADRAO)
+    tarefa = relationship('Tarefa', back_populates='registros', lazy=LAZY_PADRAO)
+    metas = relationship("MetaMensalRegistro", back_populates="registro", lazy=LAZY_PADRAO)
+
+    # Índices para as consultas por usuário + período (execução ou expiração)
+    __table_args__ = (
+        Index("ix_registros_usuario_execucao", "usuario_id", "data_execucao"),
+        Index("ix_registros_usuario_expiracao", "usuario_id", "data_expiracao"),
+    )
 
     def __repr__(self):
         return f"<RegistroDePontuacao(id={self.id}, usuario_id={self.usuario_id}, tarefa_id={self.tarefa_id}, pontos={self.pontos})>"
@@ -177,8 +194,12 @@ class MetaMensal(Base):
     data_validacao = Column(Date)
     validador_id = Column(Integer, ForeignKey('usuarios.id'), nullable=True)
 
-    usuario = relationship('Usuario', back_populates='metas', foreign_keys=[usuario_id])
-    validador = relationship('Usuario', back_populates='metas_validadas', foreign_keys=[validador_id])
+    usuario = relationship('Usuario', back_populates='metas', foreign_keys=[usuario_id], lazy=LAZY_PADRAO)
+    validador = relationship('Usuario', back_populates='metas_validadas', foreign_keys=[validador_id], lazy=LAZY_PADRAO)
+
+    __table_args__ = (
+        Index("ix_metas_usuario_anomes_status", "usuario_id", "ano_mes", "status"),
+    )
 
     def __repr__(self):
         return f"<MetaMensal(id={self.id}, usuario_id={self.usuario_id}, status='{self.status}', ano_mes='{self.ano_mes}')>"
@@ -192,5 +213,53 @@ class MetaMensalRegistro(Base):
     quantidade_utilizada = Column(Integer)
 
     # 🔗 Relacionamento com RegistroDePontuacao
-    registro = relationship("RegistroDePontuacao", back_populates="metas")
+    registro = relationship("RegistroDePontuacao", back_populates="metas", lazy=LAZY_PADRAO)
+
+    # Cobre a verificação "registro já utilizado?" (registro_id -> meta_id)
+    __table_args__ = (
+        Index("ix_meta_registro_registro_meta", "registro_id", "meta_id"),
+    )
+
+
+# ----------------------------
+# 📒 Saldo Mensal (livro-razão por usuário e mês)
+# ----------------------------
+class SaldoMensal(Base):
+    __tablename__ = "saldos_mensais"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    ano_mes = Column(String(7), nullable=False)  # YYYY-MM
+    realizado = Column(Float, nullable=False, default=0)  # pontos executados no mês
+    utilizado = Column(Float, nullable=False, default=0)  # pontos confirmados em metas do mês
+    expirado = Column(Float, nullable=False, default=0)   # pontos não utilizados que expiram no mês
+    saldo = Column(Float, nullable=False, default=0)      # realizado - utilizado - expirado
 
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "ano_mes", name="uq_saldos_mensais_usuario_mes"),
+    )
+
+    def __repr__(self):
+        return f"<SaldoMensal(usuario_id={self.usuario_id}, ano_mes='{self.ano_mes}', saldo={self.saldo})>"
+
+
+# ----------------------------
+# 🧊 Cubo de Relatórios (usuário × mês × tarefa)
+# ----------------------------
+class CuboRelatorio(Base):
+    __tablename__ = "cubo_relatorios"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    ano_mes = Column(String(7), nullable=False)  # YYYY-MM
+    tarefa_id = Column(Integer, ForeignKey("tarefas.id"), nullable=False)
+    gerado = Column(Float, nullable=False, default=0)     # pontos executados no mês
+    utilizado = Column(Float, nullable=False, default=0)  # pontos usados em metas confirmadas do mês
+    expirado = Column(Float, nullable=False, default=0)   # pontos não utilizados que expiram no mês
+
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "ano_mes", "tarefa_id", name="uq_cubo_relatorios_usuario_mes_tarefa"),
+    )
+
+    def __repr__(self):
+        return f"<CuboRelatorio(usuario_id={self.usuario_id}, ano_mes='{self.ano_mes}', tarefa_id={self.tarefa_id})>"
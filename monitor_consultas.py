@@ -0,0 +1,184 @@
+# monitor_consultas.py
+
+"""
+Contador de consultas SQL e detector de N+1, ligado ao engine por eventos
+before_cursor_execute / after_cursor_execute.
+
+É opcional: o painel só instala os eventos com
+PRODUTIVIDADE_MONITOR_CONSULTAS=1. Com o monitor instalado, cada consulta
+executada dentro de um bloco medir_consultas() é contada, cronometrada e
+agrupada pelo formato do SQL (sem valores literais e com listas IN
+colapsadas). Um mesmo formato repetido muitas vezes em uma única
+renderização é o sinal típico de N+1: um SELECT por linha de um laço em vez
+de um SELECT para o lote.
+
+Uso em testes:
+    instalar_monitor(engine)
+    with exigir_orcamento_consultas(12, nome="visao_geral", repeticoes_max=3):
+        pagina_visao_geral(session)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+
+MONITORAR_CONSULTAS = os.getenv("PRODUTIVIDADE_MONITOR_CONSULTAS") == "1"
+# A partir de quantas execuções do mesmo formato a renderização é marcada como N+1
+LIMITE_N_MAIS_UM = int(os.getenv("PRODUTIVIDADE_LIMITE_N_MAIS_UM", "5"))
+
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACOS = re.compile(r"\s+")
+
+# Medições abertas na thread atual (o Streamlit roda cada rerun em uma thread)
+_local = threading.local()
+
+
+class OrcamentoDeConsultasExcedido(AssertionError):
+    """Uma página executou mais consultas (ou repetições) do que o orçamento permite."""
+
+
+@dataclass
+class MedicaoConsultas:
+    nome: str = ""
+    consultas: int = 0
+    tempo_s: float = 0.0
+    formatos: Counter = field(default_factory=Counter)
+    tempo_por_formato: dict = field(default_factory=lambda: defaultdict(float))
+
+    def registrar(self, formato, duracao):
+        self.consultas += 1
+        self.tempo_s += duracao
+        self.formatos[formato] += 1
+        self.tempo_por_formato[formato] += duracao
+
+    def repetidas(self, minimo=LIMITE_N_MAIS_UM):
+        """Formatos executados pelo menos `minimo` vezes: [(formato, vezes, tempo_s)]."""
+        return [
+            (formato, vezes, self.tempo_por_formato[formato])
+            for formato, vezes in self.formatos.most_common()
+            if vezes >= minimo
+        ]
+
+    @property
+    def maior_repeticao(self):
+        return max(self.formatos.values(), default=0)
+
+    def resumo(self, limite=5):
+        """Texto curto com o total e os formatos mais repetidos."""
+        linhas = [f"{self.nome or 'medição'}: {self.consultas} consultas em {self.tempo_s * 1000:.1f} ms"]
+        for formato, vezes in self.formatos.most_common(limite):
+            linhas.append(f"  {vezes}x {self.tempo_por_formato[formato] * 1000:.1f} ms  {formato[:160]}")
+        return "\n".join(linhas)
+
+
+def normalizar_sql(sql):
+    """Formato da consulta: sem literais, com IN (?, ?, ...) colapsado e espaços únicos."""
+    sql = _RE_TEXTO.sub("?", sql)
+    sql = _RE_NUMERO.sub("?", sql)
+    sql = _RE_LISTA.sub("(?)", sql)
+    return _RE_ESPACOS.sub(" ", sql).strip()
+
+
+def _medicoes_abertas():
+    pilha = getattr(_local, "medicoes", None)
+    if pilha is None:
+        pilha = _local.medicoes = []
+    return pilha
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    if _medicoes_abertas():
+        conn.info["monitor_inicio"] = time.perf_counter()
+
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    medicoes = _medicoes_abertas()
+    inicio = conn.info.pop("monitor_inicio", None)
+    if not medicoes or inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    formato = normalizar_sql(statement)
+    # Medições aninhadas (página dentro do rerun, por exemplo) recebem todas a consulta
+    for medicao in medicoes:
+        medicao.registrar(formato, duracao)
+
+
+def instalar_monitor(engine):
+    """Registra os eventos do monitor no engine (chamadas repetidas são ignoradas)."""
+    if not event.contains(engine, "before_cursor_execute", _antes):
+        event.listen(engine, "before_cursor_execute", _antes)
+        event.listen(engine, "after_cursor_execute", _depois)
+    return engine
+
+
+def remover_monitor(engine):
+    if event.contains(engine, "before_cursor_execute", _antes):
+        event.remove(engine, "before_cursor_execute", _antes)
+        event.remove(engine, "after_cursor_execute", _depois)
+
+
+@contextmanager
+def medir_consultas(nome=""):
+    """
+    Mede as consultas executadas na thread atual dentro do bloco.
+    Sem o monitor instalado no engine, a medição fica zerada.
+    """
+    medicao = MedicaoConsultas(nome)
+    pilha = _medicoes_abertas()
+    pilha.append(medicao)
+    try:
+        yield medicao
+    finally:
+        pilha.remove(medicao)
+
+
+def verificar_orcamento(medicao, maximo, repeticoes_max=None):
+    """
+    Falha (OrcamentoDeConsultasExcedido) se a medição passou de `maximo`
+    consultas ou, com repeticoes_max, se algum formato se repetiu mais vezes
+    que isso (N+1).
+    """
+    problemas = []
+    if medicao.consultas > maximo:
+        problemas.append(f"{medicao.consultas} consultas (orçamento: {maximo})")
+    if repeticoes_max is not None:
+        for formato, vezes, _ in medicao.repetidas(repeticoes_max + 1):
+            problemas.append(f"{vezes}x o mesmo formato (máximo: {repeticoes_max}): {formato[:160]}")
+    if problemas:
+        raise OrcamentoDeConsultasExcedido(
+            f"{medicao.nome or 'bloco'} excedeu o orçamento de consultas:\n- " + "\n- ".join(problemas)
+            + "\n" + medicao.resumo()
+        )
+
+
+@contextmanager
+def exigir_orcamento_consultas(maximo, nome="", repeticoes_max=None):
+    """Como medir_consultas, verificando o orçamento ao sair do bloco."""
+    with medir_consultas(nome) as medicao:
+        yield medicao
+    verificar_orcamento(medicao, maximo, repeticoes_max)
+
+
+def exibir_resumo_consultas(medicao, limite=5):
+    """Resumo compacto na sidebar: total, tempo, alertas de N+1 e formatos mais frequentes."""
+    import streamlit as st
+
+    suspeitas = medicao.repetidas()
+    rotulo = f"🩺 Consultas SQL: {medicao.consultas} em {medicao.tempo_s * 1000:.1f} ms"
+    with st.sidebar.expander(f"{rotulo}{' ⚠️' if suspeitas else ''}", expanded=bool(suspeitas)):
+        for formato, vezes, tempo in suspeitas:
+            st.warning(f"Possível N+1: {vezes}x em {tempo * 1000:.0f} ms")
+            st.code(formato[:300], language="sql")
+        for formato, vezes in medicao.formatos.most_common(limite):
+            if vezes >= LIMITE_N_MAIS_UM:
+                continue
+            st.caption(f"{vezes}x · {medicao.tempo_por_formato[formato] * 1000:.1f} ms")
+            st.code(formato[:200], language="sql")
@@ -0,0 +1,213 @@
+# pdf_lote.py
+
+"""
+Geração em lote do Relatório Mensal de Produtividade (PDF de pontos
+totais) para uma equipe ou setor inteiro, entregue em um único ZIP.
+
+Os dados de todos os fiscais saem de poucas consultas agrupadas; o desenho
+dos PDFs, que é a parte cara, é distribuído entre os núcleos da máquina com
+um pool de processos. PDFs já presentes no cache_pdf não são redesenhados.
+
+Uso:
+    python pdf_lote.py 2025-08 --equipe 3 [saida.zip]
+    python pdf_lote.py 2025-08 --setor 1 [saida.zip]
+"""
+
+import io
+import multiprocessing
+import os
+import re
+import sys
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import func
+
+from db import SessionLocal
+from modelos import Usuario, Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro
+from metricas import intervalo_do_periodo, calcular_expirando_usuarios
+from consulta_pontuacao import calcular_saldos_totais, assinatura_pontos_totais, _montar_pdf_pontos_totais
+from cache_pdf import obter_pdf, guardar_pdf
+
+# Abaixo disso o custo de subir os processos não compensa
+MINIMO_PARALELO = 8
+
+
+def usuarios_do_escopo(session, equipe_id=None, setor_id=None):
+    """Ids dos usuários ativos de uma equipe ou setor (sem o admin)."""
+    consulta = session.query(Usuario.id).filter(Usuario.login != "admin", Usuario.ativo != False)
+    if equipe_id is not None:
+        consulta = consulta.filter(Usuario.equipe_id == equipe_id)
+    if setor_id is not None:
+        consulta = consulta.filter(Usuario.setor_id == setor_id)
+    return [uid for (uid,) in consulta.order_by(Usuario.id)]
+
+
+def carregar_dados_lote(session, usuario_ids, periodo):
+    """
+    Monta, para cada usuário, os argumentos do relatório de pontos totais
+    com as mesmas regras da Consulta de Pontuação, em consultas agrupadas.
+
+    Retorno:
+        - lista de dicts com usuario_id, nome, matricula, quantidades_por_codigo,
+          saldo_total e pontos_expirados
+    """
+    inicio_mes, fim_mes = intervalo_do_periodo(periodo)
+
+    usuarios = session.query(Usuario.id, Usuario.nome, Usuario.matricula).filter(
+        Usuario.id.in_(usuario_ids)
+    ).order_by(Usuario.nome).all()
+
+    # 🧮 Unidades utilizadas no período por usuário e código de tarefa ativa
+    quantidades = defaultdict(lambda: defaultdict(int))
+    for usuario_id, codigo, total in (
+        session.query(
+            MetaMensal.usuario_id,
+            Tarefa.codigo,
+            func.sum(func.coalesce(MetaMensalRegistro.quantidade_utilizada, 1))
+        )
+        .join(MetaMensalRegistro, MetaMensalRegistro.meta_id == MetaMensal.id)
+        .join(RegistroDePontuacao, MetaMensalRegistro.registro_id == RegistroDePontuacao.id)
+        .join(Tarefa, RegistroDePontuacao.tarefa_id == Tarefa.id)
+        .filter(
+            MetaMensal.usuario_id.in_(usuario_ids),
+            MetaMensal.ano_mes == periodo,
+            MetaMensal.status == "confirmado",
+            RegistroDePontuacao.usuario_id == MetaMensal.usuario_id,
+            RegistroDePontuacao.data_execucao < fim_mes,
+            Tarefa.ativa == True
+        )
+        .group_by(MetaMensal.usuario_id, Tarefa.codigo)
+    ):
+        quantidades[usuario_id][codigo] += int(total or 0)
+
+    saldos = calcular_saldos_totais(session, usuario_ids, inicio_mes)
+    expirando = calcular_expirando_usuarios(session, usuario_ids, periodo)
+
+    return [
+        {
+            "usuario_id": u.id,
+            "nome": u.nome,
+            "matricula": u.matricula or "000000",
+            "quantidades_por_codigo": dict(quantidades[u.id]),
+            "saldo_total": saldos.get(u.id, 0),
+            "pontos_expirados": expirando.get(u.id, 0),
+        }
+        for u in usuarios
+    ]
+
+
+def _renderizar(periodo, dados):
+    """Executado nos processos do pool: desenha um PDF e devolve os bytes."""
+    return _montar_pdf_pontos_totais(
+        periodo, dados["nome"], dados["matricula"], dados["quantidades_por_codigo"],
+        dados["saldo_total"], dados["pontos_expirados"]
+    )
+
+
+def _nome_arquivo(dados, periodo):
+    nome = re.sub(r"[^\w\-]+", "_", dados["nome"]).strip("_")
+    return f"relatorio_produtividade_{periodo}_{nome}_{dados['usuario_id']}.pdf"
+
+
+def gerar_lote_pontos_totais(session, usuario_ids, periodo, processos=None):
+    """
+    Gera os relatórios de pontos totais dos usuários informados.
+
+    Parâmetros:
+        - processos: tamanho do pool (padrão: número de núcleos)
+
+    Retorno:
+        - (bytes do ZIP, quantidade de PDFs, quantidade vinda do cache)
+    """
+    lote = carregar_dados_lote(session, usuario_ids, periodo)
+
+    pdfs, pendentes = {}, []
+    for dados in lote:
+        dados["chave"] = assinatura_pontos_totais(
+            periodo, dados["nome"], dados["matricula"], dados["quantidades_por_codigo"],
+            dados["saldo_total"], dados["pontos_expirados"]
+        )
+        conteudo = obter_pdf("pontos_totais", dados["usuario_id"], periodo, dados["chave"])
+        if conteudo is None:
+            pendentes.append(dados)
+        else:
+            pdfs[dados["usuario_id"]] = conteudo
+    do_cache = len(pdfs)
+
+    processos = processos or os.cpu_count() or 1
+    if processos > 1 and len(pendentes) >= MINIMO_PARALELO:
+        # spawn: o painel roda com várias threads, e fork nessas condições não é seguro
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+            resultados = pool.map(
+                _renderizar, [periodo] * len(pendentes), pendentes,
+                chunksize=max(1, len(pendentes) // (processos * 4))
+            )
+            for dados, conteudo in zip(pendentes, resultados):
+                pdfs[dados["usuario_id"]] = conteudo
+    else:
+        for dados in pendentes:
+            pdfs[dados["usuario_id"]] = _renderizar(periodo, dados)
+
+    for dados in pendentes:
+        guardar_pdf("pontos_totais", dados["usuario_id"], periodo, dados["chave"], pdfs[dados["usuario_id"]])
+
+    # PDFs já são comprimidos: ZIP só armazena
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as arquivo_zip:
+        for dados in lote:
+            arquivo_zip.writestr(_nome_arquivo(dados, periodo), pdfs[dados["usuario_id"]])
+
+    return buffer.getvalue(), len(lote), do_cache
+
+
+# -------------------------------
+# 🖥️ Interface (Consulta de Pontuação)
+# -------------------------------
+def secao_pdf_lote(session, usuarios, periodo):
+    """Botão que gera o ZIP com os relatórios de todos os usuários visíveis."""
+    import streamlit as st
+
+    st.caption(f"Gera o Relatório Mensal de Produtividade de {len(usuarios)} usuário(s) em um único ZIP.")
+    if not st.button("📦 Gerar PDFs em lote", key="gerar_pdf_lote"):
+        return
+
+    with st.spinner("Gerando relatórios..."):
+        conteudo, total, do_cache = gerar_lote_pontos_totais(session, [u.id for u in usuarios], periodo)
+
+    st.success(f"✅ {total} relatório(s) gerado(s) ({do_cache} reaproveitado(s) do cache).")
+    st.download_button(
+        "📥 Baixar ZIP",
+        data=conteudo,
+        file_name=f"relatorios_produtividade_{periodo}.zip",
+        mime="application/zip"
+    )
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    if len(argumentos) < 3 or argumentos[1] not in ("--equipe", "--setor"):
+        print("Uso: python pdf_lote.py AAAA-MM --equipe|--setor ID [saida.zip]")
+        sys.exit(1)
+
+    periodo, escopo, escopo_id = argumentos[0], argumentos[1], int(argumentos[2])
+    saida = argumentos[3] if len(argumentos) > 3 else f"relatorios_produtividade_{periodo}.zip"
+
+    session = SessionLocal()
+    try:
+        if escopo == "--equipe":
+            usuario_ids = usuarios_do_escopo(session, equipe_id=escopo_id)
+        else:
+            usuario_ids = usuarios_do_escopo(session, setor_id=escopo_id)
+        if not usuario_ids:
+            print("❌ Nenhum usuário encontrado para o escopo informado.")
+            sys.exit(1)
+        conteudo, total, do_cache = gerar_lote_pontos_totais(session, usuario_ids, periodo)
+    finally:
+        session.close()
+
+    with open(saida, "wb") as arquivo:
+        arquivo.write(conteudo)
+    print(f"📦 {total} relatórios gravados em {saida} ({do_cache} do cache).")
@@ -1,12 +1,41 @@
 import streamlit as st
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from sqlalchemy import func
 import pandas as pd
 import plotly.express as px
-from modelos import Usuario, RegistroDePontuacao, Tarefa, MetaMensalRegistro
+from modelos import Usuario
 from auth import exigir_login
 from helpers import usuarios_visiveis
+from metricas import projetar_expiracao, projetar_expiracao_usuarios
+
+
+def exibir_matriz_equipe(session, usuarios, hoje, meses, granularidade, rotulo_periodo):
+    """Matriz usuário × período dos pontos a expirar, do maior risco para o menor."""
+    nomes = {u.id: u.nome for u in usuarios}
+    linhas = projetar_expiracao_usuarios(session, list(nomes), hoje, meses, granularidade)
+
+    if not linhas:
+        st.success("✅ Nenhum ponto pendente de expiração na equipe/setor.")
+        return
+
+    df = pd.DataFrame(linhas, columns=[rotulo_periodo, "usuario_id", "Pontos"])
+    df["Usuário"] = df["usuario_id"].map(nomes)
+    matriz = df.pivot_table(
+        index="Usuário", columns=rotulo_periodo, values="Pontos", aggfunc="sum", fill_value=0
+    )
+    matriz = matriz[sorted(matriz.columns)]
+    matriz["Total"] = matriz.sum(axis=1)
+    # Risco: mais pontos a perder primeiro; no empate, quem perde mais no período mais próximo
+    matriz = matriz.sort_values(["Total", matriz.columns[0]], ascending=False)
+
+    c1, c2 = st.columns(2)
+    c1.metric("Usuários com pontos a expirar", f"{len(matriz)} de {len(nomes)}")
+    c2.metric(f"Total a expirar nos próximos {meses} meses", f"{matriz['Total'].sum():.0f} pts")
+
+    st.dataframe(
+        matriz,
+        use_container_width=True,
+        column_config={col: st.column_config.NumberColumn(format="%.0f") for col in matriz.columns}
+    )
 
 def pagina_projecao_expiracao(session):
     exigir_login()
@@ -48,29 +77,23 @@ def pagina_projecao_expiracao(session):
     # Define o usuário final
     usuario_id = usuario_selecionado_id
 
-    hoje = datetime.today().date()
-    limite = hoje + relativedelta(months=3)
+    # ⚙️ Horizonte e agrupamento da projeção
+    col1, col2 = st.columns(2)
+    meses = col1.slider("Horizonte (meses)", min_value=1, max_value=12, value=3)
+    agrupar_por = col2.radio("Agrupar por", ["Mês", "Semana"], horizontal=True)
+    granularidade = "semana" if agrupar_por == "Semana" else "mes"
+    rotulo_periodo = "Semana de Expiração" if granularidade == "semana" else "Mês de Expiração"
 
-    # Registros que ainda não foram utilizados e expiram nos próximos 3 meses
-    registros = session.query(RegistroDePontuacao).filter(
-        RegistroDePontuacao.usuario_id == usuario_id,
-        RegistroDePontuacao.data_expiracao >= hoje,
-        RegistroDePontuacao.data_expiracao <= limite
-    ).all()
-
-    tarefas = {t.id: t for t in session.query(Tarefa).filter_by(ativa=True).all()}
+    hoje = datetime.today().date()
 
-    expiracoes = {}
-    for r in registros:
-        # Ignora registros já utilizados
-        utilizado = session.query(MetaMensalRegistro).filter_by(registro_id=r.id).first()
-        if utilizado:
-            continue
+    # 👥 Visão de equipe/setor: todos os usuários visíveis de uma vez
+    if nivel_acesso not in ("fiscal", "usuario"):
+        if st.toggle("👥 Ver toda a equipe/setor"):
+            exibir_matriz_equipe(session, usuarios, hoje, meses, granularidade, rotulo_periodo)
+            return
 
-        tarefa = tarefas.get(r.tarefa_id)
-        pontos = tarefa.pontos
-        mes_expira = r.data_expiracao.strftime('%Y-%m')
-        expiracoes[mes_expira] = expiracoes.get(mes_expira, 0) + pontos
+    # Registros ainda não utilizados que expiram dentro do horizonte
+    expiracoes = dict(projetar_expiracao(session, [usuario_id], hoje, meses, granularidade))
 
     if not expiracoes:
         st.success("✅ Nenhum ponto pendente de expiração nos próximos meses.")
@@ -78,17 +101,17 @@ def pagina_projecao_expiracao(session):
 
     # Tabela de expirações
     st.warning("⚠️ Pontos que irão expirar se não forem utilizados:")
-    df = pd.DataFrame(list(expiracoes.items()), columns=["Mês de Expiração", "Pontos"])
-    df = df.sort_values("Mês de Expiração")
+    df = pd.DataFrame(list(expiracoes.items()), columns=[rotulo_periodo, "Pontos"])
+    df = df.sort_values(rotulo_periodo)
     # Garante que o eixo X será categórico e na ordem cronológica
-    df["Mês de Expiração"] = pd.Categorical(df["Mês de Expiração"], categories=df["Mês de Expiração"], ordered=True)
+    df[rotulo_periodo] = pd.Categorical(df[rotulo_periodo], categories=df[rotulo_periodo], ordered=True)
 
     st.dataframe(df, use_container_width=True)
 
     # Gráfico de barras
     fig = px.bar(
         df,
-        x="Mês de Expiração",
+        x=rotulo_periodo,
         y="Pontos",
         text="Pontos",
         title="Projeção de Expiração de Pontos",
@@ -98,12 +121,12 @@ def pagina_projecao_expiracao(session):
     )
     fig.update_traces(textposition="outside")
     fig.update_layout(
-        xaxis=dict(type='category', title="Mês"),
+        xaxis=dict(type='category', title="Semana" if granularidade == "semana" else "Mês"),
         yaxis=dict(title="Pontos")
     )
     st.plotly_chart(fig, use_container_width=True)
 
     # Métrica total
     total = df["Pontos"].sum()
-    st.metric("Total a expirar nos próximos meses", f"{total:.0f} pts")
+    st.metric(f"Total a expirar nos próximos {meses} meses", f"{total:.0f} pts")
 
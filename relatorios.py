@@ -1,52 +1,103 @@
 # relatorios.py - 
+from datetime import datetime
+
 import pandas as pd
-from sqlalchemy import text
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text, bindparam
 from db import engine  # Usa a mesma conexão central definida no projeto
 
-def obter_saldo_por_tarefa(usuario_id: int = None, mes: str = None) -> pd.DataFrame:
-    """
-    Retorna o saldo de pontos por tarefa, agrupado por usuário e mês.
+# Unidades de cada registro já consumidas por metas confirmadas
+SUBQUERY_USO = """
+    SELECT mr.registro_id, SUM(COALESCE(mr.quantidade_utilizada, 1)) AS unidades
+    FROM meta_mensal_registro mr
+    JOIN metas_mensais m ON m.id = mr.meta_id
+    WHERE m.status = 'confirmado'
+    GROUP BY mr.registro_id
+"""
 
-    Parâmetros:
-        - usuario_id (int, opcional): filtra por ID do usuário
-        - mes (str, opcional): filtra por mês no formato 'YYYY-MM'
 
-    Retorno:
-        - DataFrame com colunas: usuario_id, usuario, mes, tarefa_id, tarefa,
-          pontos_gerados, pontos_usados, saldo
-    """
-    query = """
+def _montar_consulta(usuario_id=None, usuario_ids=None, mes=None, data_inicial=None, data_final=None):
+    """Monta o SELECT agrupado com os filtros como parâmetros (antes do GROUP BY)."""
+    filtros, parametros = [], {}
+
+    if usuario_id is not None:
+        filtros.append("r.usuario_id = :usuario_id")
+        parametros["usuario_id"] = usuario_id
+    if usuario_ids is not None:
+        filtros.append("r.usuario_id IN :usuario_ids")
+        parametros["usuario_ids"] = [int(uid) for uid in usuario_ids]
+
+    if mes:
+        # Intervalo de datas em vez de strftime: aproveita os índices por usuário/data
+        inicio_mes = datetime.strptime(str(mes)[:7], "%Y-%m").date()
+        filtros.append("r.data_execucao >= :inicio_mes AND r.data_execucao < :fim_mes")
+        parametros.update(inicio_mes=inicio_mes, fim_mes=inicio_mes + relativedelta(months=1))
+    if data_inicial:
+        filtros.append("r.data_execucao >= :data_inicial")
+        parametros["data_inicial"] = data_inicial
+    if data_final:
+        filtros.append("r.data_execucao <= :data_final")
+        parametros["data_final"] = data_final
+
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    query = f"""
     SELECT
         u.id AS usuario_id,
         u.nome AS usuario,
         strftime('%Y-%m', r.data_execucao) AS mes,
         t.id AS tarefa_id,
         t.descricao AS tarefa,
-        SUM(r.pontos) AS pontos_gerados,
-        SUM(CASE WHEN r.usado_para_meta = 1 THEN r.pontos ELSE 0 END) AS pontos_usados,
-        SUM(r.pontos) - SUM(CASE WHEN r.usado_para_meta = 1 THEN r.pontos ELSE 0 END) AS saldo
+        SUM(r.pontos * COALESCE(r.quantidade, 1)) AS pontos_gerados,
+        SUM(r.pontos * COALESCE(uso.unidades, 0)) AS pontos_usados,
+        SUM(r.pontos * (COALESCE(r.quantidade, 1) - COALESCE(uso.unidades, 0))) AS saldo
     FROM registros_de_pontuacao r
     JOIN usuarios u ON u.id = r.usuario_id
     JOIN tarefas t ON t.id = r.tarefa_id
-    GROUP BY usuario_id, mes, tarefa_id
-    ORDER BY mes, usuario_id, tarefa_id;
+    LEFT JOIN ({SUBQUERY_USO}) uso ON uso.registro_id = r.id
+    {where}
+    GROUP BY u.id, mes, t.id
+    ORDER BY mes, u.id, t.id;
+    """
+
+    consulta = text(query)
+    if "usuario_ids" in parametros:
+        consulta = consulta.bindparams(bindparam("usuario_ids", expanding=True))
+    return consulta, parametros
+
+
+def obter_saldo_por_tarefa(usuario_id: int = None, mes: str = None, usuario_ids=None,
+                           data_inicial=None, data_final=None, tamanho_lote: int = None, bind=None):
     """
+    Retorna o saldo de pontos por tarefa, agrupado por usuário e mês.
+
+    Parâmetros:
+        - usuario_id (int, opcional): filtra por ID do usuário
+        - mes (str, opcional): filtra por mês no formato 'YYYY-MM'
+        - usuario_ids (lista, opcional): filtra por vários usuários
+        - data_inicial / data_final (date, opcional): intervalo de execução (inclusivo)
+        - tamanho_lote (int, opcional): em vez de um DataFrame, devolve um
+          iterador de DataFrames com até tamanho_lote linhas cada
+
+    Retorno:
+        - DataFrame (ou iterador de DataFrames) com colunas: usuario_id, usuario,
+          mes, tarefa_id, tarefa, pontos_gerados, pontos_usados, saldo
+    """
+    consulta, parametros = _montar_consulta(usuario_id, usuario_ids, mes, data_inicial, data_final)
+    bind = bind or engine
+
+    if tamanho_lote:
+        return _ler_em_lotes(bind, consulta, parametros, tamanho_lote)
 
     try:
         # usa conexão direta via engine do SQLAlchemy
-        with engine.connect() as conn:
-            df = pd.read_sql_query(text(query), conn)
+        with bind.connect() as conn:
+            return pd.read_sql_query(consulta, conn, params=parametros)
     except Exception as e:
         print("❌ Erro ao consultar o banco:", e)
         return pd.DataFrame()
 
-    # Filtros opcionais
-    if usuario_id is not None:
-        df = df[df["usuario_id"] == usuario_id]
-
-    if mes:
-        mes = str(mes)[:7]  # garante 'YYYY-MM'
-        df = df[df["mes"] == mes]
-
-    return df
 
+def _ler_em_lotes(bind, consulta, parametros, tamanho_lote):
+    # stream_results: o driver entrega as linhas aos poucos, sem carregar tudo
+    with bind.connect().execution_options(stream_results=True) as conn:
+        yield from pd.read_sql_query(consulta, conn, params=parametros, chunksize=tamanho_lote)
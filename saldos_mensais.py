@@ -0,0 +1,224 @@
+# saldos_mensais.py
+
+"""
+Livro-razão mensal de pontos por usuário (tabela saldos_mensais).
+
+As telas que gravam registros ou confirmam metas chamam
+atualizar_saldos_mensais antes do commit, na mesma transação, informando
+os pares (usuario_id, 'YYYY-MM') afetados. O script pode ser executado de
+forma independente para reconstruir a tabela inteira (backfill).
+
+As mesmas chaves atualizam também o cubo de relatórios (cubo_relatorios),
+que detalha os movimentos por tarefa.
+"""
+
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+import pandas as pd
+from sqlalchemy import func, or_, select
+from db import SessionLocal
+from modelos import RegistroDePontuacao, MetaMensal, SaldoMensal
+from helpers import unidades_disponiveis
+from cubo_relatorios import atualizar_cubo, recalcular_cubo
+
+
+def mes_de(data):
+    """Retorna o mês de uma data no formato 'YYYY-MM'."""
+    return data.strftime("%Y-%m")
+
+
+def chaves_do_registro(registro):
+    """Pares (usuario_id, mês) cujo saldo depende do registro informado."""
+    return {
+        (registro.usuario_id, mes_de(registro.data_execucao)),
+        (registro.usuario_id, mes_de(registro.data_expiracao)),
+    }
+
+
+def _calcular_movimentos(session, usuario_ids=None, mes_min=None, mes_max=None):
+    """
+    Soma realizado, utilizado e expirado por (usuario_id, mês) direto no banco.
+    Sem filtros, calcula para todos os usuários e meses.
+    """
+    mes_execucao = func.strftime("%Y-%m", RegistroDePontuacao.data_execucao)
+    mes_expiracao = func.strftime("%Y-%m", RegistroDePontuacao.data_expiracao)
+
+    quantidade = func.coalesce(RegistroDePontuacao.quantidade, 1)
+    disponivel = unidades_disponiveis()
+
+    realizado = session.query(
+        RegistroDePontuacao.usuario_id, mes_execucao, func.sum(RegistroDePontuacao.pontos * quantidade)
+    ).group_by(RegistroDePontuacao.usuario_id, mes_execucao)
+    utilizado = session.query(
+        MetaMensal.usuario_id, MetaMensal.ano_mes, func.sum(MetaMensal.pontos_utilizados)
+    ).filter(MetaMensal.status == "confirmado").group_by(MetaMensal.usuario_id, MetaMensal.ano_mes)
+    expirado = session.query(
+        RegistroDePontuacao.usuario_id, mes_expiracao, func.sum(RegistroDePontuacao.pontos * disponivel)
+    ).filter(disponivel > 0).group_by(RegistroDePontuacao.usuario_id, mes_expiracao)
+
+    if usuario_ids is not None:
+        realizado = realizado.filter(RegistroDePontuacao.usuario_id.in_(usuario_ids))
+        utilizado = utilizado.filter(MetaMensal.usuario_id.in_(usuario_ids))
+        expirado = expirado.filter(RegistroDePontuacao.usuario_id.in_(usuario_ids))
+    if mes_min is not None:
+        # Filtra por intervalo de datas para aproveitar os índices por usuário/data
+        inicio = datetime.strptime(mes_min, "%Y-%m").date()
+        fim = datetime.strptime(mes_max, "%Y-%m").date() + relativedelta(months=1)
+        realizado = realizado.filter(
+            RegistroDePontuacao.data_execucao >= inicio,
+            RegistroDePontuacao.data_execucao < fim
+        )
+        utilizado = utilizado.filter(MetaMensal.ano_mes.between(mes_min, mes_max))
+        expirado = expirado.filter(
+            RegistroDePontuacao.data_expiracao >= inicio,
+            RegistroDePontuacao.data_expiracao < fim
+        )
+
+    movimentos = {}
+    for posicao, query in enumerate((realizado, utilizado, expirado)):
+        for usuario_id, mes, total in query.all():
+            movimentos.setdefault((usuario_id, mes), [0, 0, 0])[posicao] = total or 0
+    return movimentos
+
+
+def _aplicar(linha, valores):
+    realizado, utilizado, expirado = valores
+    linha.realizado = realizado
+    linha.utilizado = utilizado
+    linha.expirado = expirado
+    linha.saldo = realizado - utilizado - expirado
+
+
+def atualizar_saldos_mensais(session, chaves):
+    """
+    Recalcula as linhas do livro-razão para os pares (usuario_id, mês)
+    informados. Não faz commit: deve ser chamada antes do commit de quem
+    gravou os dados, para que tudo fique na mesma transação.
+    """
+    chaves = {(uid, mes) for uid, mes in chaves if uid is not None and mes}
+    if not chaves:
+        return
+
+    session.flush()
+    usuario_ids = {uid for uid, _ in chaves}
+    meses = sorted(mes for _, mes in chaves)
+    movimentos = _calcular_movimentos(session, usuario_ids, meses[0], meses[-1])
+
+    existentes = {
+        (s.usuario_id, s.ano_mes): s
+        for s in session.query(SaldoMensal).filter(
+            SaldoMensal.usuario_id.in_(usuario_ids),
+            SaldoMensal.ano_mes.in_(set(meses))
+        )
+    }
+
+    for chave in chaves:
+        valores = movimentos.get(chave, [0, 0, 0])
+        linha = existentes.get(chave)
+        if not any(valores):
+            if linha is not None:
+                session.delete(linha)
+            continue
+        if linha is None:
+            linha = SaldoMensal(usuario_id=chave[0], ano_mes=chave[1])
+            session.add(linha)
+        _aplicar(linha, valores)
+
+    atualizar_cubo(session, chaves)
+
+
+def reconstruir_saldos_mensais(session=None):
+    """Apaga e recalcula todo o livro-razão a partir dos registros e metas."""
+    propria_sessao = session is None
+    if propria_sessao:
+        session = SessionLocal()
+
+    try:
+        session.query(SaldoMensal).delete(synchronize_session=False)
+        linhas = []
+        for (usuario_id, mes), valores in _calcular_movimentos(session).items():
+            linha = SaldoMensal(usuario_id=usuario_id, ano_mes=mes)
+            _aplicar(linha, valores)
+            linhas.append(linha)
+        session.add_all(linhas)
+        recalcular_cubo(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if propria_sessao:
+            session.close()
+
+    return len(linhas)
+
+
+def preencher_saldos_mensais_se_vazio():
+    """Faz o backfill do livro-razão em bancos que ainda não o possuem."""
+    session = SessionLocal()
+    try:
+        vazio = session.query(SaldoMensal.id).first() is None
+        tem_dados = session.query(RegistroDePontuacao.id).first() is not None
+    finally:
+        session.close()
+    if vazio and tem_dados:
+        return reconstruir_saldos_mensais()
+    return 0
+
+
+def obter_saldos_mensais(session, usuario_ids, mes_inicial=None, mes_final=None):
+    """Lê as linhas do livro-razão dos usuários informados, em ordem de mês."""
+    query = session.query(SaldoMensal).filter(SaldoMensal.usuario_id.in_(list(usuario_ids)))
+    if mes_inicial:
+        query = query.filter(SaldoMensal.ano_mes >= mes_inicial)
+    if mes_final:
+        query = query.filter(SaldoMensal.ano_mes <= mes_final)
+    return query.order_by(SaldoMensal.ano_mes, SaldoMensal.usuario_id).all()
+
+
+def serie_mensal(session, usuario_ids, mes_inicial=None, mes_final=None, por_usuario=False):
+    """
+    Série mensal de realizado e usados direto do livro-razão, agrupada em SQL
+    e lida com pd.read_sql (sem carregar objetos ORM).
+
+    Parâmetros:
+        - usuario_ids: um ou vários usuários; por padrão os valores são somados
+        - por_usuario: True mantém uma linha por (mês, usuário)
+
+    Meses só com expiração (inclusive os futuros, em que vencem os registros
+    atuais) ficam de fora: a série tem apenas meses com realizado ou usados.
+
+    Retorno:
+        - DataFrame com mes, [usuario_id,] valor_realizado e valor_usados
+    """
+    colunas = [SaldoMensal.ano_mes.label("mes")]
+    if por_usuario:
+        colunas.append(SaldoMensal.usuario_id)
+    agrupamento = list(colunas)
+    realizado = func.sum(SaldoMensal.realizado)
+    utilizado = func.sum(SaldoMensal.utilizado)
+    colunas += [realizado.label("valor_realizado"), utilizado.label("valor_usados")]
+
+    consulta = select(*colunas).where(SaldoMensal.usuario_id.in_(list(usuario_ids)))
+    if mes_inicial:
+        consulta = consulta.where(SaldoMensal.ano_mes >= mes_inicial)
+    if mes_final:
+        consulta = consulta.where(SaldoMensal.ano_mes <= mes_final)
+    consulta = (
+        consulta.group_by(*agrupamento)
+        .having(or_(realizado != 0, utilizado != 0))
+        .order_by(*agrupamento)
+    )
+
+    df = pd.read_sql(consulta, session.connection())
+    tipos = {"mes": "object", "valor_realizado": "float64", "valor_usados": "float64"}
+    if por_usuario:
+        tipos["usuario_id"] = "int64"
+    return df.astype(tipos)
+
+
+if __name__ == "__main__":
+    from db import init_db
+    init_db()
+    total = reconstruir_saldos_mensais()
+    print(f"📒 {total} linhas de saldo mensal reconstruídas.")
@@ -0,0 +1,41 @@
+# tabela_tarefas.py
+
+"""
+Tabela oficial de tarefas e pontos por unidade: (código, descrição, pontos).
+
+É a única cópia da tabela no projeto. carregar_tarefas sincroniza o banco a
+partir dela e o relatório mensal em PDF lista as linhas nesta ordem.
+"""
+
+TABELA_TAREFAS = (
+    ("01", "Plantão Fiscal ½ Período", 15.00),
+    ("02", "Diligência Externa", 4.00),
+    ("02.1", "Diligência Externa fora do perímetro urbano", 6.00),
+    ("03", "Termo de Início de Ação Fiscal", 3.00),
+    ("04", "Análise de Documentos Fiscais (por lote de 50)", 4.00),
+    ("05", "Demonstrativo de Apuração de Débito Fiscal (por folha)", 4.00),
+    ("06", "Notificação", 3.00),
+    ("07", "Termo de Ocorrências", 4.00),
+    ("08", "Termo de Diligências", 2.00),
+    ("09", "Lançamento de ISSQN no Movimento Econômico (por exercício)", 2.00),
+    ("10", "Informação/Manifestação em Processo", 5.00),
+    ("11", "Elaboração de Relatórios", 5.00),
+    ("12", "Publicação de Edital", 4.00),
+    ("13", "Outras Atividades não Previstas (por unidade de 1 hora)", 4.00),
+    ("14", "Participação em Cursos ou Programas de Treinamento (por ½ período)", 15.00),
+    ("15", "Apuração Fiscal c/ resultado para um exercício", 52.00),
+    ("15.1", "Apuração Fiscal c/ resultado para exercícios adicionais", 24.00),
+    ("16", "Apuração Fiscal s/ resultado para um exercício", 30.00),
+    ("16.1", "Apuração Fiscal s/ resultado para exercícios adicionais", 8.00),
+    ("17", "Notificação para constituição de crédito tributário (sem A.Infração)", 8.00),
+    ("18", "Enquadramento do ISSQN", 8.00),
+    ("19", "Atividades Internas (por unidade de 1h)", 4.00),
+    ("20", "Auto de Infração", 6.00),
+    ("21", "Manifestação em processo de impugnação de Auto de Infração", 8.00),
+    ("21.1", "Quando o manifestante não for o autor do Auto de Infração", 12.00),
+    ("22", "Chefia ou direção de órgão responsável por atividades previstas nesta tabela (ponto por dia)", 30.00),
+    ("98", "Licenciado", 0),
+    ("99", "Licenciado", 600),
+)
+
+CODIGOS_TAREFAS = frozenset(codigo for codigo, _, _ in TABELA_TAREFAS)
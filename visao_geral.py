@@ -1,41 +1,20 @@
 # visao_geral.py - 
 
-import pandas as pd
 import altair as alt
 from datetime import datetime, timedelta
 import streamlit as st
 
 # no topo de visao_geral.py
-from modelos import Tarefa, RegistroDePontuacao, MetaMensal, MetaMensalRegistro, Usuario
+from modelos import Usuario
 from auth import exigir_login
 from helpers import usuarios_visiveis
+from saldos_mensais import serie_mensal
+from metricas import calcular_alerta_prescricao
 
 
-# -------------------------
-# Função utilitária
-# -------------------------
-def agrupar_por_mes(registros, campo_data, campo_valor):
-    if not registros:
-        return pd.DataFrame(columns=["mes", "valor"])
-    dados = []
-    for r in registros:
-        data = getattr(r, campo_data, None)
-        valor = getattr(r, campo_valor, None)
-        if data and valor is not None:
-            dados.append({
-                "mes": data.strftime("%Y-%m"),
-                "valor": valor
-            })
-    df = pd.DataFrame(dados)
-    if "mes" not in df.columns or df.empty:
-        return pd.DataFrame(columns=["mes", "valor"])
-    return df.groupby("mes", as_index=False).sum()
-
 # -------------------------
 # Página principal
 # -------------------------
-from datetime import datetime, date, timedelta
-from dateutil.relativedelta import relativedelta
 
 def pagina_visao_geral(session):
     """Exibe visão geral de produtividade do usuário logado."""
@@ -76,66 +55,20 @@ def pagina_visao_geral(session):
     hoje = datetime.today()
     inicio_periodo = hoje.replace(day=1) - timedelta(days=365)
 
-    # Consulta aos registros de pontuação
-    registros = session.query(RegistroDePontuacao).filter(
-        RegistroDePontuacao.usuario_id == usuario_id,
-        RegistroDePontuacao.data_execucao >= inicio_periodo
-    ).all()
-
-    # Consulta aos usos confirmados
-    usos = session.query(MetaMensal).filter(
-        MetaMensal.usuario_id == usuario_id,
-        MetaMensal.status == "confirmado"
-    ).all()
-
-    # Agrupamento por mês
-    pontos_mes = agrupar_por_mes(registros, "data_execucao", "pontos")
-    usados_mes = agrupar_por_mes(usos, "data_validacao", "pontos_utilizados") \
-        if usos else pd.DataFrame(columns=["mes", "valor"])
-
-    # Renomear para merge
-    pontos_mes.rename(columns={"valor": "valor_realizado"}, inplace=True)
-    usados_mes.rename(columns={"valor": "valor_usados"}, inplace=True)
-
-    # Merge dos DataFrames
-    df_geral = pd.merge(pontos_mes, usados_mes, on="mes", how="outer").fillna(0)
-    df_geral = df_geral.sort_values("mes")
+    # Totais mensais lidos do livro-razão (uma linha por mês), até o mês atual:
+    # o livro-razão também tem linhas futuras, nos meses de expiração dos registros
+    df_geral = serie_mensal(
+        session, [usuario_id], mes_inicial=inicio_periodo.strftime("%Y-%m"), mes_final=hoje.strftime("%Y-%m")
+    )
 
     # -------------------------
     # 🔔 Alerta de prescrição de pontos
     # -------------------------
-    mes_prescricao_str = (hoje.replace(year=hoje.year - 1)).strftime("%Y-%m")
-    linha_prescricao = df_geral[df_geral["mes"] == mes_prescricao_str]
-
-    if not linha_prescricao.empty:
-        pontos_realizados_antigos = float(linha_prescricao.iloc[0]["valor_realizado"])
-
-        # Definir intervalo de datas para o mês da prescrição
-        inicio_mes_prescricao = date(hoje.year - 1, hoje.month, 1)
-        fim_mes_prescricao = inicio_mes_prescricao + relativedelta(months=1)
-
-        # Calcular pontos antigos já usados
-        pontos_usados_antigos = 0
-        for uso in usos:
-            registros_relacionados = (
-                session.query(MetaMensalRegistro)
-                .join(RegistroDePontuacao)
-                .filter(
-                    MetaMensalRegistro.meta_id == uso.id,
-                    RegistroDePontuacao.usuario_id == usuario_id,
-                    RegistroDePontuacao.data_execucao >= inicio_mes_prescricao,
-                    RegistroDePontuacao.data_execucao < fim_mes_prescricao
-                )
-                .all()
-            )
-
-            for reg in registros_relacionados:
-                tarefa = session.query(Tarefa).get(
-                    session.query(RegistroDePontuacao).get(reg.registro_id).tarefa_id
-                )
-                pontos_usados_antigos += tarefa.pontos
+    alerta = calcular_alerta_prescricao(session, usuario_id, hoje)
 
-        saldo_prescrever = max(pontos_realizados_antigos - pontos_usados_antigos, 0)
+    if alerta is not None:
+        mes_prescricao_str = alerta["mes"]
+        saldo_prescrever = alerta["saldo"]
 
         if saldo_prescrever > 0:
             st.markdown(f"""